@@ -0,0 +1 @@
+"""Offline benchmarks for QuitSmokeBot (run as ``python -m no_quitting_bot.benchmarks.<name>``)."""
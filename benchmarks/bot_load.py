@@ -0,0 +1,230 @@
+"""Synthetic load test of the bot handlers against a stub Telegram API.
+
+Usage::
+
+    python -m no_quitting_bot.benchmarks.bot_load [--users 200] [--actions 20] [--rate 200] [--api-latency-ms 30]
+
+Runs fully offline: ``bot_main`` is imported against a fresh temporary
+SQLite database and its ``Bot`` gets a fake session that records API calls
+and answers with canned responses after ``--api-latency-ms``. Every
+simulated user onboards (``/start`` + setup answers) and then presses
+random hub buttons (``SMOKE_NOW``, ``REFRESH``, ``UNDO``, ``ALT_DONE``);
+a user's updates are sequential, users run concurrently and all updates
+share a ``--rate`` updates/s budget. Updates go through ``dp.feed_update``,
+so middlewares, FSM storage and the unit of work are all exercised.
+
+Reports p50/p95/p99 latency, SQL queries and Bot API calls per update,
+grouped by update kind.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict
+
+ONBOARDING = ("/start", "20", "20", "20")
+ACTIONS = ("SMOKE_NOW", "REFRESH", "UNDO", "ALT_DONE")
+FAKE_TOKEN = "123456:" + "A" * 35
+
+
+@dataclass(slots=True)
+class _Sample:
+    kind: str
+    api_calls: int = 0
+
+
+@dataclass
+class KindStats:
+    latencies: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+    api_calls: list[int] = field(default_factory=list)
+    errors: Counter[str] = field(default_factory=Counter)
+
+    def row(self, kind: str) -> str:
+        lat = sorted(self.latencies)
+        pct = {p: lat[min(int(len(lat) * p / 100), len(lat) - 1)] * 1000 for p in (50, 95, 99)}
+        return (
+            f"{kind:<12}{len(lat):>8}{sum(self.errors.values()):>8}{pct[50]:>9.1f}{pct[95]:>9.1f}{pct[99]:>9.1f}"
+            f"{statistics.fmean(self.queries):>10.2f}{statistics.fmean(self.api_calls):>9.2f}"
+        )
+
+
+_current: ContextVar[_Sample | None] = ContextVar("bench_sample", default=None)
+
+
+def _make_session(latency: float):
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import EditMessageText, SendMessage
+    from aiogram.types import Message
+
+    message_ids = itertools.count(1000)
+
+    class FakeSession(BaseSession):
+        """Records calls; send/edit return a plausible ``Message``, everything else ``True``."""
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.calls: Counter[str] = Counter()
+
+        async def close(self) -> None:
+            pass
+
+        async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+            if False:
+                yield b""
+
+        async def make_request(self, bot, method, timeout=None):  # noqa: ANN001
+            self.calls[type(method).__name__] += 1
+            if (sample := _current.get()) is not None:
+                sample.api_calls += 1
+            if latency:
+                await asyncio.sleep(latency)
+            if isinstance(method, (SendMessage, EditMessageText)):
+                return Message.model_validate(
+                    {
+                        "message_id": getattr(method, "message_id", None) or next(message_ids),
+                        "date": 0,
+                        "chat": {"id": method.chat_id, "type": "private"},
+                        "text": method.text,
+                    }
+                )
+            return True
+
+    return FakeSession()
+
+
+def _updates():
+    from aiogram.types import Update
+
+    ids = itertools.count(1)
+
+    def message(user_id: int, text: str) -> Update:
+        payload: Dict[str, Any] = {
+            "message_id": next(ids),
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            payload["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return Update.model_validate({"update_id": next(ids), "message": payload})
+
+    def callback(user_id: int, data: str) -> Update:
+        return Update.model_validate(
+            {
+                "update_id": next(ids),
+                "callback_query": {
+                    "id": str(next(ids)),
+                    "chat_instance": "bench",
+                    "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+                    "data": data,
+                    "message": {"message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"}, "text": "hub"},
+                },
+            }
+        )
+
+    return message, callback
+
+
+async def _run(users: int, actions: int, rate: float, latency: float) -> None:
+    from no_quitting_bot.dataproviders.db import run_migrations
+    from no_quitting_bot.entrypoints import bot_main
+    from no_quitting_bot.utils.broadcast import TokenBucket
+
+    run_migrations()
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)  # one line per update otherwise
+    session = _make_session(latency)
+    session.middleware = bot_main.bot.session.middleware  # keep the bot's request middlewares
+    bot_main.bot.session = session
+    message, callback = _updates()
+    stats: dict[str, KindStats] = defaultdict(KindStats)
+
+    async def measure(
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any, data: Dict[str, Any]
+    ) -> Any:
+        # registered after the unit-of-work middleware, so data["uow"] is the update's unit of work
+        sample = _Sample(data["bench_kind"])
+        token = _current.set(sample)
+        try:
+            return await handler(event, data)
+        finally:
+            _current.reset(token)
+            stats[sample.kind].queries.append(data["uow"].query_count)
+            stats[sample.kind].api_calls.append(sample.api_calls)
+
+    dp = bot_main.create_dispatcher()
+    dp.update.outer_middleware(measure)
+    bucket = TokenBucket(rate, capacity=max(rate / 10, 1))
+
+    async def feed(kind: str, update: Any) -> None:
+        await bucket.acquire()
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot_main.bot, update, bench_kind=kind)
+        except Exception as e:
+            stats[kind].errors[type(e).__name__] += 1
+        stats[kind].latencies.append(time.perf_counter() - started)
+
+    async def simulate(user_id: int) -> None:
+        for i, text in enumerate(ONBOARDING):
+            await feed("start" if i == 0 else "onboarding", message(user_id, text))
+        for _ in range(actions):
+            action = random.choice(ACTIONS)
+            await feed(action, callback(user_id, action))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate(1_000_000 + i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    await bot_main.storage.close()
+
+    total = sum(len(s.latencies) for s in stats.values())
+    print(f"{total} updates from {users} users in {elapsed:.1f}s ({total / elapsed:.0f} updates/s, target {rate:.0f})")
+    print(f"{'kind':<12}{'count':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>10}{'api':>9}")
+    for kind in ("start", "onboarding", *ACTIONS):
+        if kind in stats:
+            print(stats[kind].row(kind))
+    all_stats = KindStats(
+        latencies=[x for s in stats.values() for x in s.latencies],
+        queries=[x for s in stats.values() for x in s.queries],
+        api_calls=[x for s in stats.values() for x in s.api_calls],
+        errors=sum((s.errors for s in stats.values()), Counter()),
+    )
+    print(all_stats.row("all"))
+    if all_stats.errors:
+        print("Errors:", ", ".join(f"{name}={n}" for name, n in all_stats.errors.most_common()))
+    print("API calls:", ", ".join(f"{name}={n}" for name, n in session.calls.most_common()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--actions", type=int, default=20, help="hub button presses per user after onboarding")
+    parser.add_argument("--rate", type=float, default=200.0, help="target updates per second (all users)")
+    parser.add_argument("--api-latency-ms", type=float, default=30.0, help="simulated Bot API round trip")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # must be set before bot_main (and the engine) is imported
+        os.environ["QS_DB_FILENAME"] = str(Path(tmp) / "bench.db")
+        os.environ.setdefault("BOT_TOKEN", FAKE_TOKEN)
+        os.environ["QS_STATE_BACKEND"] = "memory"
+        asyncio.run(_run(args.users, args.actions, args.rate, args.api_latency_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Compare read/write throughput of the SQLite engine profiles.
+
+Usage::
+
+    python -m no_quitting_bot.benchmarks.sqlite_profile [--writers 8] [--readers 8] [--seconds 5]
+
+Each profile gets a fresh temporary database. Writer tasks register
+smoking events (event insert + daily rollup upsert, one transaction each)
+while reader tasks run the hub's per-user queries, all through the async
+engine like the bot handlers do.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from no_quitting_bot.dataproviders.db import SQLITE_PROFILES, Base, make_async_engine, make_engine
+from no_quitting_bot.dataproviders.repositories._models import SmokingEventModel, UserModel
+from no_quitting_bot.dataproviders.repositories.daily_stats_repository import increment_stmt
+
+USERS = 1000
+
+
+async def _run_profile(profile: str, writers: int, readers: int, seconds: float) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        sync_engine = make_engine(f"sqlite:///{path}", profile)
+        Base.metadata.create_all(sync_engine)
+        with sync_engine.begin() as conn:
+            conn.execute(
+                UserModel.__table__.insert(),
+                [
+                    {"telegram_id": i, "cigarettes_per_day": 20, "cigarette_cost": 1.0, "interval_minutes": 72}
+                    for i in range(USERS)
+                ],
+            )
+        sync_engine.dispose()
+
+        engine = make_async_engine(f"sqlite+aiosqlite:///{path}", profile)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        counters = {"writes": 0, "reads": 0, "locked": 0}
+        deadline = time.monotonic() + seconds
+
+        async def writer() -> None:
+            while time.monotonic() < deadline:
+                user_id = random.randrange(USERS)
+                now = dt.datetime.utcnow()
+                try:
+                    async with sessions.begin() as session:
+                        session.add(
+                            SmokingEventModel(
+                                user_id=user_id, timestamp=now, planned_time=now, was_early=False, interval_before=72
+                            )
+                        )
+                        await session.execute(increment_stmt("sqlite", user_id, now.date(), 1, 0, 1.0))
+                    counters["writes"] += 1
+                except OperationalError:
+                    counters["locked"] += 1
+
+        async def reader() -> None:
+            while time.monotonic() < deadline:
+                user_id = random.randrange(USERS)
+                try:
+                    async with sessions() as session:
+                        await session.scalar(select(UserModel).where(UserModel.telegram_id == user_id))
+                        await session.scalar(
+                            select(func.count())
+                            .select_from(SmokingEventModel)
+                            .where(SmokingEventModel.user_id == user_id)
+                        )
+                    counters["reads"] += 1
+                except OperationalError:
+                    counters["locked"] += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(writer() for _ in range(writers)), *(reader() for _ in range(readers)))
+        elapsed = time.monotonic() - started
+        await engine.dispose()
+
+    return {
+        "writes/s": counters["writes"] / elapsed,
+        "reads/s": counters["reads"] / elapsed,
+        "locked errors": counters["locked"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    for profile in SQLITE_PROFILES:
+        result = asyncio.run(_run_profile(profile, args.writers, args.readers, args.seconds))
+        print(f"{profile:>8}: " + "  ".join(f"{k}={v:.0f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Cold-start benchmark of the webhook entrypoint.
+
+Usage::
+
+    python -m no_quitting_bot.benchmarks.startup [--runs 5] [--api-latency-ms 100]
+
+Two measurements, each the median over ``--runs`` fresh interpreters:
+
+* **import** - ``import no_quitting_bot.entrypoints.webhook`` (and
+  ``bot_main`` on its own) in a new process.
+* **time to first response** - ``python -m no_quitting_bot.entrypoints.webhook``
+  is started against a stub Bot API server (``QS_TELEGRAM_API_URL``) and an
+  existing SQLite file. Reported are the times from process start until the
+  HTTP port accepts connections (*listen*), until a ``/start`` update POSTed
+  to ``/webhook`` is acknowledged (*ack*), and until the bot's reply reaches
+  the stub API (*reply*). The stub answers after ``--api-latency-ms``, a
+  typical round trip to the real Bot API.
+
+Runs fully offline; the numbers are meant to be compared between commits on
+the same machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from aiohttp import ClientSession, web
+
+FAKE_TOKEN = "123456:" + "A" * 35
+WEBHOOK_SECRET = "bench-secret"
+USER_ID = 4242
+TIMEOUT_SECONDS = 60.0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env(**extra: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update(BOT_TOKEN=FAKE_TOKEN, BASE_URL="http://127.0.0.1", WEBHOOK_SECRET=WEBHOOK_SECRET)
+    env.update(QS_STATE_BACKEND="memory")
+    env.update(extra)
+    return env
+
+
+def measure_import(module: str, db_path: Path) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        env=_env(QS_DB_FILENAME=str(db_path)),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+class StubBotAPI:
+    """Answers every Bot API method; records when the first ``sendMessage`` arrives."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.replied = asyncio.Event()
+        self.calls: list[str] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls.append(method)
+        await asyncio.sleep(self.latency)
+        result: Any = True
+        if method.lower() == "sendmessage":
+            form = await request.post()
+            result = {
+                "message_id": len(self.calls),
+                "date": 0,
+                "chat": {"id": int(form.get("chat_id", USER_ID)), "type": "private"},
+                "text": form.get("text", ""),
+            }
+            self.replied.set()
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+def _start_update() -> dict[str, Any]:
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": USER_ID, "type": "private"},
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "bench"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def _wait_for_port(port: int, proc: subprocess.Popen, deadline: float) -> None:
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"webhook process exited with {proc.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("webhook port never opened") from None
+            await asyncio.sleep(0.005)
+
+
+async def measure_first_response(db_path: Path, api_latency: float) -> tuple[float, float, float]:
+    stub = StubBotAPI(api_latency)
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    api_port, port = _free_port(), _free_port()
+    await web.TCPSite(runner, "127.0.0.1", api_port).start()
+    env = _env(
+        QS_DB_FILENAME=str(db_path),
+        QS_TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}",
+        PORT=str(port),
+    )
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "no_quitting_bot.entrypoints.webhook"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + TIMEOUT_SECONDS
+        await _wait_for_port(port, proc, deadline)
+        listening = time.perf_counter() - started
+        async with ClientSession() as http:
+            async with http.post(
+                f"http://127.0.0.1:{port}/webhook",
+                json=_start_update(),
+                headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET},
+            ) as response:
+                response.raise_for_status()
+        acked = time.perf_counter() - started
+        await asyncio.wait_for(stub.replied.wait(), deadline - time.perf_counter())
+        replied = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        # off the loop: the shutdown hooks still call the stub API (deleteWebhook)
+        await asyncio.to_thread(proc.wait, TIMEOUT_SECONDS)
+        await runner.cleanup()
+    return listening, acked, replied
+
+
+def _ms(values: list[float]) -> str:
+    return f"{statistics.median(values) * 1000:>8.0f} ms  (min {min(values) * 1000:.0f}, max {max(values) * 1000:.0f})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--api-latency-ms", type=float, default=100.0, help="stub Bot API round trip")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        imports: dict[str, list[float]] = {"bot_main": [], "webhook": []}
+        listen: list[float] = []
+        ack: list[float] = []
+        reply: list[float] = []
+        # one database for all runs: the first (unmeasured) round creates it, so measured
+        # runs are restarts against an existing, up-to-date schema
+        db_path = Path(tmp) / "startup.db"
+        for i in range(args.runs + 1):  # the first round also warms the bytecode and OS caches
+            timings = {
+                name: measure_import(f"no_quitting_bot.entrypoints.{name}", db_path) for name in imports
+            }
+            first = asyncio.run(measure_first_response(db_path, args.api_latency_ms / 1000))
+            if i == 0:
+                continue
+            for name, value in timings.items():
+                imports[name].append(value)
+            for values, value in zip((listen, ack, reply), first):
+                values.append(value)
+
+    print(f"{args.runs} runs, median (stub Bot API latency {args.api_latency_ms:.0f} ms)")
+    for name, values in imports.items():
+        print(f"import {name:<22}{_ms(values)}")
+    print(f"{'time to listen':<29}{_ms(listen)}")
+    print(f"{'time to ack first update':<29}{_ms(ack)}")
+    print(f"{'time to first reply':<29}{_ms(reply)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""Per-user, per-day rollup of smoking events."""
+
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class DailyStats:
+    user_id: int
+    day: dt.date
+    smoked: int = 0
+    early: int = 0  # how many of ``smoked`` were early
+    spent: float = 0.0
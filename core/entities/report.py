@@ -0,0 +1,16 @@
+"""Read models produced by reporting queries."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class UserPeriodCount:
+    """Cigarettes smoked by one user within a reporting period."""
+
+    telegram_id: int
+    cigarettes_per_day: int
+    cigarette_cost: float
+    smoked: int
+    spent: float = 0.0
@@ -18,6 +18,7 @@ class User:
     spent: float = 0.0
     savings: float = 0.0
     hub_message_id: int | None = None
+    last_event_at: dt.datetime | None = None  # timestamp of the latest smoking event
 
     # Delay suggestion tracking
     last_delay_offer: dt.datetime | None = None
@@ -25,6 +26,9 @@ class User:
     target_cigs_per_day: int | None = None
     days_success_streak: int = 0
 
+    # Optimistic concurrency token: bumped by every write of the row
+    version: int = 0
+
     def update_interval(self, new_interval: int) -> None:
         self.interval_minutes = new_interval
         self.last_interval_update = dt.datetime.utcnow()
@@ -1 +1,4 @@
-"""Repository interfaces.""" 
\ No newline at end of file
+"""Repository interfaces."""
+
+# Rows per chunk for the repositories' streaming (keyset-paginated) iterators
+DEFAULT_BATCH_SIZE = 1000 
\ No newline at end of file
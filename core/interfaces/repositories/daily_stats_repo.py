@@ -0,0 +1,37 @@
+"""Repository interface for the daily stats rollup."""
+
+from __future__ import annotations
+
+import abc
+import datetime as dt
+from typing import List, Protocol
+
+from no_quitting_bot.core.entities.daily_stats import DailyStats
+
+
+class AbstractDailyStatsRepository(Protocol):
+    """Contract for the incrementally maintained ``(user, day)`` rollup."""
+
+    @abc.abstractmethod
+    def increment(self, user_id: int, day: dt.date, smoked: int, early: int, spent: float) -> None:
+        """Add the deltas to the row for ``(user_id, day)``, creating it if needed."""
+
+    @abc.abstractmethod
+    def get(self, user_id: int, day: dt.date) -> DailyStats | None: ...
+
+    @abc.abstractmethod
+    def list_between(self, user_id: int, start: dt.date, end: dt.date) -> List[DailyStats]:
+        """Rows with ``start <= day < end``, oldest first."""
+
+
+class AbstractAsyncDailyStatsRepository(Protocol):
+    """Async contract for the daily stats rollup."""
+
+    @abc.abstractmethod
+    async def increment(self, user_id: int, day: dt.date, smoked: int, early: int, spent: float) -> None: ...
+
+    @abc.abstractmethod
+    async def get(self, user_id: int, day: dt.date) -> DailyStats | None: ...
+
+    @abc.abstractmethod
+    async def list_between(self, user_id: int, start: dt.date, end: dt.date) -> List[DailyStats]: ...
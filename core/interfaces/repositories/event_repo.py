@@ -3,9 +3,11 @@
 from __future__ import annotations
 
 import abc
-from typing import List, Protocol
+import datetime as dt
+from typing import AsyncIterator, Iterator, List, Protocol
 
 from no_quitting_bot.core.entities.smoking_event import SmokingEvent
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
 
 
 class AbstractSmokingEventRepository(Protocol):
@@ -15,10 +17,69 @@ class AbstractSmokingEventRepository(Protocol):
     def add(self, event: SmokingEvent) -> None: ...
 
     @abc.abstractmethod
-    def list_by_user(self, user_id: int, limit: int | None = None) -> List[SmokingEvent]: ...
+    def list_by_user(
+        self,
+        user_id: int,
+        limit: int | None = None,
+        after_timestamp: dt.datetime | None = None,
+        after_id: int | None = None,
+        newest_first: bool = True,
+    ) -> List[SmokingEvent]:
+        """Events ordered by ``(timestamp, id)``, newest first unless ``newest_first`` is false.
+
+        With a cursor only events that come after ``(after_timestamp, after_id)``
+        in that order are returned (keyset pagination: pass the last event of
+        the previous page).
+        """
 
     @abc.abstractmethod
     def delete(self, event_id: int) -> None: ...
 
     @abc.abstractmethod
-    def get_last(self, user_id: int) -> SmokingEvent | None: ... 
\ No newline at end of file
+    def get_last(self, user_id: int) -> SmokingEvent | None: ...
+
+    @abc.abstractmethod
+    def count_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> int:
+        """Number of events with ``start <= timestamp < end``."""
+
+    @abc.abstractmethod
+    def list_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> List[SmokingEvent]:
+        """Events with ``start <= timestamp < end``, newest first."""
+
+    @abc.abstractmethod
+    def iter_by_user(self, user_id: int, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[SmokingEvent]]:
+        """Yield all of the user's events in chunks of at most ``batch_size``, oldest first."""
+
+
+class AbstractAsyncSmokingEventRepository(Protocol):
+    """Async contract for persisting smoking events."""
+
+    @abc.abstractmethod
+    async def add(self, event: SmokingEvent) -> None: ...
+
+    @abc.abstractmethod
+    async def list_by_user(
+        self,
+        user_id: int,
+        limit: int | None = None,
+        after_timestamp: dt.datetime | None = None,
+        after_id: int | None = None,
+        newest_first: bool = True,
+    ) -> List[SmokingEvent]: ...
+
+    @abc.abstractmethod
+    async def delete(self, event_id: int) -> None: ...
+
+    @abc.abstractmethod
+    async def get_last(self, user_id: int) -> SmokingEvent | None: ...
+
+    @abc.abstractmethod
+    async def count_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> int: ...
+
+    @abc.abstractmethod
+    async def list_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> List[SmokingEvent]: ...
+
+    @abc.abstractmethod
+    def iter_by_user(
+        self, user_id: int, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[List[SmokingEvent]]: ...
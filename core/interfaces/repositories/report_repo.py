@@ -0,0 +1,29 @@
+"""Repository interface for aggregated, read-only reporting queries."""
+
+from __future__ import annotations
+
+import abc
+import datetime as dt
+from typing import AsyncIterator, Iterator, List, Protocol
+
+from no_quitting_bot.core.entities.report import UserPeriodCount
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+
+
+class AbstractReportRepository(Protocol):
+    """Contract for set-based reporting queries."""
+
+    @abc.abstractmethod
+    def iter_period_counts(
+        self, start: dt.date, end: dt.date, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[List[UserPeriodCount]]:
+        """Yield every user with their totals for days ``[start, end)``, in chunks ordered by telegram id."""
+
+
+class AbstractAsyncReportRepository(Protocol):
+    """Async contract for set-based reporting queries."""
+
+    @abc.abstractmethod
+    def iter_period_counts(
+        self, start: dt.date, end: dt.date, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[List[UserPeriodCount]]: ...
@@ -3,13 +3,25 @@
 from __future__ import annotations
 
 import abc
-from typing import Protocol, List
+import datetime as dt
+from typing import AsyncIterator, Iterable, Iterator, Protocol, List, Tuple
 
 from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+
+
+class ConcurrentUpdateError(Exception):
+    """The user row kept changing and a conditional update could not be applied."""
 
 
 class AbstractUserRepository(Protocol):
-    """User repository contract."""
+    """User repository contract.
+
+    Every write bumps ``User.version``. The ``*_if_version`` methods are
+    compare-and-swap writes: they only apply if the stored row still has the
+    entity's version, return ``False`` otherwise, and refresh the entity's
+    version on success.
+    """
 
     @abc.abstractmethod
     def get_by_telegram_id(self, telegram_id: int) -> User | None: ...
@@ -18,7 +30,122 @@ class AbstractUserRepository(Protocol):
     def add(self, user: User) -> None: ...
 
     @abc.abstractmethod
-    def update(self, user: User) -> None: ...
+    def update(self, user: User) -> None:
+        """:meth:`update_if_version` that raises :class:`ConcurrentUpdateError` instead of returning ``False``."""
+
+    @abc.abstractmethod
+    def update_if_version(self, user: User, spent_delta: float = 0.0) -> bool:
+        """Write ``user`` if unchanged since loaded; ``spent_delta`` is added to the stored ``spent``."""
+
+    @abc.abstractmethod
+    def increment_spent(self, telegram_id: int, amount: float) -> float:
+        """Atomically add ``amount`` (may be negative, floored at 0); returns the new total."""
+
+    @abc.abstractmethod
+    def set_next_allowed_if_version(self, user: User, next_allowed_time: dt.datetime) -> bool: ...
+
+    @abc.abstractmethod
+    def set_hub_message_id(self, user: User, message_id: int) -> None:
+        """Write only ``hub_message_id``, leaving concurrent changes to other columns intact."""
+
+    @abc.abstractmethod
+    def set_last_delay_offer(self, user: User, offered_at: dt.datetime) -> None:
+        """Write only ``last_delay_offer``, leaving concurrent changes to other columns intact."""
+
+    @abc.abstractmethod
+    def bump_version(self, user: User) -> None:
+        """Bump ``version`` alone, for changes to what the user sees that the row does not store."""
+
+    @abc.abstractmethod
+    def mark_seen(self, telegram_id: int, seen_at: dt.datetime) -> bool:
+        """Record that the user was active; False if there is no such user.
+
+        Leaves ``version`` alone, as the entity does not carry the column.
+        """
+
+    @abc.abstractmethod
+    def list_seen_since(self, since: dt.datetime) -> List[User]:
+        """Users marked seen at or after ``since``."""
+
+    @abc.abstractmethod
+    def iter_all(self, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[User]]:
+        """Yield every user in chunks of at most ``batch_size``, ordered by telegram id."""
+
+    @abc.abstractmethod
+    def list_by_telegram_ids(self, telegram_ids: Iterable[int]) -> List[User]:
+        """Users among ``telegram_ids`` (unknown ids are skipped), fetched in batches."""
+
+    @abc.abstractmethod
+    def bulk_update_growth(self, users: Iterable[User]) -> List[int]:
+        """Write the adaptive-growth columns of many users in one transaction.
+
+        Compare-and-swap per row: a user whose stored version differs from the
+        entity's is skipped. Returns the telegram ids of the skipped users.
+        """
+
+    @abc.abstractmethod
+    def iter_inactive(self, before: dt.datetime, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[User]]:
+        """Chunks of the users whose latest event is older than ``before`` or who have none.
+
+        Users without events come first, the rest follow oldest activity first.
+        """
+
+    @abc.abstractmethod
+    def list_next_allowed_between(self, after: dt.datetime, until: dt.datetime) -> List[Tuple[int, dt.datetime]]:
+        """``(telegram_id, next_allowed_time)`` of users whose ``after < next_allowed_time <= until``."""
+
+
+class AbstractAsyncUserRepository(Protocol):
+    """Async user repository contract (same semantics, awaitable methods)."""
+
+    @abc.abstractmethod
+    async def get_by_telegram_id(self, telegram_id: int) -> User | None: ...
+
+    @abc.abstractmethod
+    async def add(self, user: User) -> None: ...
+
+    @abc.abstractmethod
+    async def update(self, user: User) -> None: ...
+
+    @abc.abstractmethod
+    async def update_if_version(self, user: User, spent_delta: float = 0.0) -> bool: ...
+
+    @abc.abstractmethod
+    async def increment_spent(self, telegram_id: int, amount: float) -> float: ...
+
+    @abc.abstractmethod
+    async def set_next_allowed_if_version(self, user: User, next_allowed_time: dt.datetime) -> bool: ...
+
+    @abc.abstractmethod
+    async def set_hub_message_id(self, user: User, message_id: int) -> None: ...
+
+    @abc.abstractmethod
+    async def set_last_delay_offer(self, user: User, offered_at: dt.datetime) -> None: ...
+
+    @abc.abstractmethod
+    async def bump_version(self, user: User) -> None: ...
+
+    @abc.abstractmethod
+    async def mark_seen(self, telegram_id: int, seen_at: dt.datetime) -> bool: ...
+
+    @abc.abstractmethod
+    async def list_seen_since(self, since: dt.datetime) -> List[User]: ...
+
+    @abc.abstractmethod
+    def iter_all(self, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[List[User]]: ...
+
+    @abc.abstractmethod
+    async def list_by_telegram_ids(self, telegram_ids: Iterable[int]) -> List[User]: ...
+
+    @abc.abstractmethod
+    async def bulk_update_growth(self, users: Iterable[User]) -> List[int]: ...
+
+    @abc.abstractmethod
+    def iter_inactive(
+        self, before: dt.datetime, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[List[User]]: ...
 
     @abc.abstractmethod
-    def list_all(self) -> List[User]: ... 
\ No newline at end of file
+    async def list_next_allowed_between(
+        self, after: dt.datetime, until: dt.datetime
+    ) -> List[Tuple[int, dt.datetime]]: ...
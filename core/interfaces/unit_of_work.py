@@ -0,0 +1,20 @@
+"""Abstract unit of work for the sync repositories."""
+
+from __future__ import annotations
+
+import abc
+from typing import Protocol
+
+
+class AbstractUnitOfWork(Protocol):
+    """Context manager under which repository calls share one transaction.
+
+    The transaction is committed on a clean exit and rolled back if the block
+    raises, so a use case's writes land together or not at all.
+    """
+
+    @abc.abstractmethod
+    def __enter__(self) -> AbstractUnitOfWork: ...
+
+    @abc.abstractmethod
+    def __exit__(self, exc_type, exc, tb) -> None: ...  # noqa: ANN001
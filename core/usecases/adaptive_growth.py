@@ -3,37 +3,96 @@
 from __future__ import annotations
 
 import datetime as dt
+from typing import List
 
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
+from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    AbstractUserRepository,
+)
 
 MAX_INTERVAL_MINUTES = 12 * 60  # 12 hours
+CAS_ATTEMPTS = 5  # reload-and-retry rounds for users changed while their chunk was being grown
 
 
-def execute(user_repo: AbstractUserRepository) -> None:
-    """Adjust users' intervals based on success streaks."""
-    today = dt.datetime.utcnow().date()
-    users = user_repo.list_all()
+def _grow(user: User, today: dt.date) -> bool:
+    """Apply growth rules to ``user``; return False if growth is paused."""
+    # Skip if growth pause is active
+    if user.growth_pause_until and today < user.growth_pause_until:
+        return False
+
+    # Clear pause flag if period ended
+    if user.growth_pause_until and today >= user.growth_pause_until:
+        user.growth_pause_until = None
+
+    # Apply growth when streak threshold reached
+    if user.days_success_streak >= 3:
+        new_interval = int(user.interval_minutes * 1.15)
+        new_interval = min(new_interval, MAX_INTERVAL_MINUTES)
+        user.update_interval(new_interval)
+        user.days_success_streak = 0
+
+        # Optionally decrease target cigarettes per day
+        if user.target_cigs_per_day and user.target_cigs_per_day > 1:
+            threshold_minutes = (24 * 60) // (user.target_cigs_per_day - 1)
+            if new_interval >= threshold_minutes:
+                user.target_cigs_per_day -= 1
+    return True
+
+
+def _snapshot(user: User) -> tuple:
+    return (
+        user.interval_minutes,
+        user.days_success_streak,
+        user.growth_pause_until,
+        user.target_cigs_per_day,
+    )
+
+
+def _changed_users(users: List[User], today: dt.date) -> List[User]:
+    """Apply growth to every user and return only those whose state changed."""
+    changed = []
     for user in users:
-        # Skip if growth pause is active
-        if user.growth_pause_until and today < user.growth_pause_until:
-            continue
-
-        # Clear pause flag if period ended
-        if user.growth_pause_until and today >= user.growth_pause_until:
-            user.growth_pause_until = None
-
-        # Apply growth when streak threshold reached
-        if user.days_success_streak >= 3:
-            new_interval = int(user.interval_minutes * 1.15)
-            new_interval = min(new_interval, MAX_INTERVAL_MINUTES)
-            user.update_interval(new_interval)
-            user.days_success_streak = 0
-
-            # Optionally decrease target cigarettes per day
-            if user.target_cigs_per_day and user.target_cigs_per_day > 1:
-                threshold_minutes = (24 * 60) // (user.target_cigs_per_day - 1)
-                if new_interval >= threshold_minutes:
-                    user.target_cigs_per_day -= 1
-
-        # Persist changes
-        user_repo.update(user) 
\ No newline at end of file
+        before = _snapshot(user)
+        if _grow(user, today) and _snapshot(user) != before:
+            changed.append(user)
+    return changed
+
+
+def execute(user_repo: AbstractUserRepository, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Adjust users' intervals based on success streaks.
+
+    Users are streamed in chunks of ``batch_size``; each chunk's changed users
+    are persisted in one batched transaction before the next is read, so
+    memory does not grow with the number of users. The write is conditional
+    on each row's version: users changed concurrently (a smoke logged, a
+    setting edited) are reloaded and grown again. Returns the number of
+    users persisted.
+    """
+    today = dt.datetime.utcnow().date()
+    updated = 0
+    for users in user_repo.iter_all(batch_size):
+        changed = _changed_users(users, today)
+        for _ in range(CAS_ATTEMPTS):
+            stale = user_repo.bulk_update_growth(changed) if changed else []
+            updated += len(changed) - len(stale)
+            if not stale:
+                break
+            changed = _changed_users(user_repo.list_by_telegram_ids(stale), today)
+    return updated
+
+
+async def execute_async(user_repo: AbstractAsyncUserRepository, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Async variant of :func:`execute`."""
+    today = dt.datetime.utcnow().date()
+    updated = 0
+    async for users in user_repo.iter_all(batch_size):
+        changed = _changed_users(users, today)
+        for _ in range(CAS_ATTEMPTS):
+            stale = await user_repo.bulk_update_growth(changed) if changed else []
+            updated += len(changed) - len(stale)
+            if not stale:
+                break
+            changed = _changed_users(await user_repo.list_by_telegram_ids(stale), today)
+    return updated
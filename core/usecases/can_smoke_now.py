@@ -4,12 +4,14 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
+from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    AbstractUserRepository,
+)
 
 
-def execute(telegram_id: int, user_repo: AbstractUserRepository) -> tuple[bool, int]:
-    """Return (can_smoke, seconds_left)."""
-    user = user_repo.get_by_telegram_id(telegram_id)
+def _check(user: User | None) -> tuple[bool, int]:
     if not user:
         raise ValueError("User not initialized. Send /start first.")
 
@@ -18,4 +20,14 @@ def execute(telegram_id: int, user_repo: AbstractUserRepository) -> tuple[bool,
         return True, 0
 
     seconds_left = int((user.next_allowed_time - now).total_seconds())
-    return False, max(seconds_left, 0) 
\ No newline at end of file
+    return False, max(seconds_left, 0)
+
+
+def execute(telegram_id: int, user_repo: AbstractUserRepository) -> tuple[bool, int]:
+    """Return (can_smoke, seconds_left)."""
+    return _check(user_repo.get_by_telegram_id(telegram_id))
+
+
+async def execute_async(telegram_id: int, user_repo: AbstractAsyncUserRepository) -> tuple[bool, int]:
+    """Async variant of :func:`execute`."""
+    return _check(await user_repo.get_by_telegram_id(telegram_id))
@@ -0,0 +1,84 @@
+"""Use case to page through a user's smoking history, newest first."""
+
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from no_quitting_bot.core.entities.smoking_event import SmokingEvent
+from no_quitting_bot.core.interfaces.repositories.event_repo import (
+    AbstractAsyncSmokingEventRepository,
+    AbstractSmokingEventRepository,
+)
+
+PAGE_SIZE = 10
+
+# (timestamp, id) of an event; pages are keyed by it instead of an offset
+Cursor = Tuple[dt.datetime, int]
+
+
+@dataclass(slots=True)
+class HistoryPage:
+    events: List[SmokingEvent] = field(default_factory=list)  # newest first
+    has_newer: bool = False
+    has_older: bool = False
+
+    @property
+    def newest(self) -> Cursor | None:
+        return (self.events[0].timestamp, self.events[0].id) if self.events else None
+
+    @property
+    def oldest(self) -> Cursor | None:
+        return (self.events[-1].timestamp, self.events[-1].id) if self.events else None
+
+
+# One extra row is fetched to learn whether another page follows in that
+# direction. The opposite direction is known from where we came from.
+
+
+def _older_page(events: List[SmokingEvent], page_size: int, has_newer: bool) -> HistoryPage:
+    return HistoryPage(events[:page_size], has_newer=has_newer, has_older=len(events) > page_size)
+
+
+def _newer_page(events: List[SmokingEvent], page_size: int) -> HistoryPage | None:
+    """Page from events newer than a cursor (oldest first); ``None`` if it would be the first page."""
+    if len(events) <= page_size:
+        return None  # reached the top: show a full first page instead of a short one
+    return HistoryPage(events[page_size - 1 :: -1], has_newer=True, has_older=True)
+
+
+def execute(
+    telegram_id: int,
+    event_repo: AbstractSmokingEventRepository,
+    older_than: Cursor | None = None,
+    newer_than: Cursor | None = None,
+    page_size: int = PAGE_SIZE,
+) -> HistoryPage:
+    """Page of events before ``older_than``, after ``newer_than``, or the newest page."""
+    if newer_than is not None:
+        events = event_repo.list_by_user(telegram_id, page_size + 1, *newer_than, newest_first=False)
+        if (page := _newer_page(events, page_size)) is not None:
+            return page
+    elif older_than is not None:
+        events = event_repo.list_by_user(telegram_id, page_size + 1, *older_than)
+        return _older_page(events, page_size, True)
+    return _older_page(event_repo.list_by_user(telegram_id, page_size + 1), page_size, False)
+
+
+async def execute_async(
+    telegram_id: int,
+    event_repo: AbstractAsyncSmokingEventRepository,
+    older_than: Cursor | None = None,
+    newer_than: Cursor | None = None,
+    page_size: int = PAGE_SIZE,
+) -> HistoryPage:
+    """Async variant of :func:`execute`."""
+    if newer_than is not None:
+        events = await event_repo.list_by_user(telegram_id, page_size + 1, *newer_than, newest_first=False)
+        if (page := _newer_page(events, page_size)) is not None:
+            return page
+    elif older_than is not None:
+        events = await event_repo.list_by_user(telegram_id, page_size + 1, *older_than)
+        return _older_page(events, page_size, True)
+    return _older_page(await event_repo.list_by_user(telegram_id, page_size + 1), page_size, False)
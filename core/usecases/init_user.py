@@ -6,7 +6,10 @@ import math
 from datetime import datetime, timedelta
 
 from no_quitting_bot.core.entities.user import User
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    AbstractUserRepository,
+)
 
 # Constants
 MIN_INTERVAL_MINUTES = 20  # floor
@@ -19,25 +22,19 @@ def calculate_initial_interval(cigs_per_day: int) -> int:
     return max(int(interval), MIN_INTERVAL_MINUTES)
 
 
-def execute(
+def _build_user(
     telegram_id: int,
     cigarettes_per_day: int,
     price_per_pack: float,
     cigarettes_per_pack: int,
-    user_repo: AbstractUserRepository,
 ) -> User:
-    """Initialize a user and persist. Returns created or existing User."""
-    user = user_repo.get_by_telegram_id(telegram_id)
-    if user:
-        return user  # already initialized
-
     interval_minutes = calculate_initial_interval(cigarettes_per_day)
     price_per_cig = price_per_pack / cigarettes_per_pack
 
     now = datetime.utcnow()
     next_allowed = now  # allow immediately on first run
 
-    user = User(
+    return User(
         telegram_id=telegram_id,
         cigarettes_per_day=cigarettes_per_day,
         cigarette_cost=price_per_cig,
@@ -46,5 +43,36 @@ def execute(
         next_allowed_time=next_allowed,
     )
 
+
+def execute(
+    telegram_id: int,
+    cigarettes_per_day: int,
+    price_per_pack: float,
+    cigarettes_per_pack: int,
+    user_repo: AbstractUserRepository,
+) -> User:
+    """Initialize a user and persist. Returns created or existing User."""
+    user = user_repo.get_by_telegram_id(telegram_id)
+    if user:
+        return user  # already initialized
+
+    user = _build_user(telegram_id, cigarettes_per_day, price_per_pack, cigarettes_per_pack)
     user_repo.add(user)
-    return user 
\ No newline at end of file
+    return user
+
+
+async def execute_async(
+    telegram_id: int,
+    cigarettes_per_day: int,
+    price_per_pack: float,
+    cigarettes_per_pack: int,
+    user_repo: AbstractAsyncUserRepository,
+) -> User:
+    """Async variant of :func:`execute`."""
+    user = await user_repo.get_by_telegram_id(telegram_id)
+    if user:
+        return user  # already initialized
+
+    user = _build_user(telegram_id, cigarettes_per_day, price_per_pack, cigarettes_per_pack)
+    await user_repo.add(user)
+    return user
@@ -5,8 +5,21 @@ from __future__ import annotations
 import datetime as dt
 
 from no_quitting_bot.core.entities.smoking_event import SmokingEvent
-from no_quitting_bot.core.interfaces.repositories.event_repo import AbstractSmokingEventRepository
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
+from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.core.interfaces.repositories.daily_stats_repo import (
+    AbstractAsyncDailyStatsRepository,
+    AbstractDailyStatsRepository,
+)
+from no_quitting_bot.core.interfaces.repositories.event_repo import (
+    AbstractAsyncSmokingEventRepository,
+    AbstractSmokingEventRepository,
+)
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    AbstractUserRepository,
+    ConcurrentUpdateError,
+)
+from no_quitting_bot.core.interfaces.unit_of_work import AbstractUnitOfWork
 
 # Constants
 # (фиксированный рост каждые 2 дня более не используется)
@@ -15,14 +28,11 @@ MAX_INTERVAL_MINUTES = 12 * 60  # 12 hours
 MIN_INTERVAL_MINUTES = 20
 EARLY_COUNTER_LIMIT = 3
 EARLY_DECREASE_FACTOR = 0.95  # reduce 5%
+CAS_ATTEMPTS = 5  # reload-and-retry rounds when the user row changed concurrently
 
 
-def execute(
-    telegram_id: int,
-    user_repo: AbstractUserRepository,
-    event_repo: AbstractSmokingEventRepository,
-) -> SmokingEvent:
-    user = user_repo.get_by_telegram_id(telegram_id)
+def _apply(user: User | None) -> SmokingEvent:
+    """Mutate ``user`` for a smoked cigarette and return the new event."""
     if not user:
         raise ValueError("User not initialized. Send /start first.")
 
@@ -64,9 +74,52 @@ def execute(
 
     # Update next allowed time
     user.next_allowed_time = now + dt.timedelta(minutes=user.interval_minutes)
+    user.last_event_at = now
+
+    return event
+
+
+def execute(
+    telegram_id: int,
+    user_repo: AbstractUserRepository,
+    event_repo: AbstractSmokingEventRepository,
+    stats_repo: AbstractDailyStatsRepository,
+    uow: AbstractUnitOfWork,
+) -> SmokingEvent:
+    """Record a smoke; the user, event and rollup writes share ``uow``'s transaction."""
+    with uow:
+        for _ in range(CAS_ATTEMPTS):
+            user = user_repo.get_by_telegram_id(telegram_id)
+            event = _apply(user)
+            # Persist changes (spent is incremented in SQL, so concurrent smokes both count)
+            if user_repo.update_if_version(user, spent_delta=user.cigarette_cost):
+                break
+        else:
+            raise ConcurrentUpdateError(telegram_id)
+
+        event_repo.add(event)
+        stats_repo.increment(user.telegram_id, event.timestamp.date(), 1, int(event.was_early), user.cigarette_cost)
+
+    return event
+
+
+async def execute_async(
+    telegram_id: int,
+    user_repo: AbstractAsyncUserRepository,
+    event_repo: AbstractAsyncSmokingEventRepository,
+    stats_repo: AbstractAsyncDailyStatsRepository,
+) -> SmokingEvent:
+    """Async variant of :func:`execute`."""
+    for _ in range(CAS_ATTEMPTS):
+        user = await user_repo.get_by_telegram_id(telegram_id)
+        event = _apply(user)
+        # Persist changes (spent is incremented in SQL, so concurrent smokes both count)
+        if await user_repo.update_if_version(user, spent_delta=user.cigarette_cost):
+            break
+    else:
+        raise ConcurrentUpdateError(telegram_id)
 
-    # Persist changes
-    user_repo.update(user)
-    event_repo.add(event)
+    await event_repo.add(event)
+    await stats_repo.increment(user.telegram_id, event.timestamp.date(), 1, int(event.was_early), user.cigarette_cost)
 
     return event 
\ No newline at end of file
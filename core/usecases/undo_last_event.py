@@ -3,42 +3,99 @@
 from __future__ import annotations
 
 import datetime as dt
+from typing import List
 
-from no_quitting_bot.core.interfaces.repositories.event_repo import AbstractSmokingEventRepository
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
+from no_quitting_bot.core.entities.smoking_event import SmokingEvent
+from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.core.interfaces.repositories.daily_stats_repo import (
+    AbstractAsyncDailyStatsRepository,
+    AbstractDailyStatsRepository,
+)
+from no_quitting_bot.core.interfaces.repositories.event_repo import (
+    AbstractAsyncSmokingEventRepository,
+    AbstractSmokingEventRepository,
+)
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    AbstractUserRepository,
+    ConcurrentUpdateError,
+)
+from no_quitting_bot.core.interfaces.unit_of_work import AbstractUnitOfWork
 
 ALLOWED_MINUTES = 10
+CAS_ATTEMPTS = 5
 
 
 class CannotUndo(Exception):
     pass
 
 
-def execute(telegram_id: int, user_repo: AbstractUserRepository, event_repo: AbstractSmokingEventRepository) -> None:
-    user = user_repo.get_by_telegram_id(telegram_id)
+def _check_user(user: User | None) -> User:
     if not user:
         raise CannotUndo("Пользователь не найден")
+    return user
 
-    last_event = event_repo.get_last(telegram_id)
-    if not last_event:
+
+def _apply(user: User, recent_events: List[SmokingEvent]) -> SmokingEvent:
+    """Revert ``user`` state for the newest of ``recent_events`` and return that event."""
+    if not recent_events:
         raise CannotUndo("Нет события для отмены")
+    last_event = recent_events[0]
 
     now = dt.datetime.utcnow()
     if (now - last_event.timestamp).total_seconds() > ALLOWED_MINUTES * 60:
         raise CannotUndo("Слишком поздно отменять")
 
+    if last_event.id is None:
+        raise CannotUndo("Невозможно отменить — не найден идентификатор события")
+
     # revert spent
     user.spent -= user.cigarette_cost
     user.spent = max(user.spent, 0)
 
-    # restore next_allowed_time
+    # restore next_allowed_time and the latest-event marker
     user.next_allowed_time = last_event.planned_time
+    user.last_event_at = recent_events[1].timestamp if len(recent_events) > 1 else None
+    return last_event
+
 
-    # persist changes to user before deleting event
-    user_repo.update(user)
+def execute(
+    telegram_id: int,
+    user_repo: AbstractUserRepository,
+    event_repo: AbstractSmokingEventRepository,
+    stats_repo: AbstractDailyStatsRepository,
+    uow: AbstractUnitOfWork,
+) -> None:
+    """Undo the last smoke; the user, event and rollup writes share ``uow``'s transaction."""
+    with uow:
+        for _ in range(CAS_ATTEMPTS):
+            user = _check_user(user_repo.get_by_telegram_id(telegram_id))
+            event = _apply(user, event_repo.list_by_user(telegram_id, limit=2))
+            # persist changes to user before deleting event
+            if user_repo.update_if_version(user, spent_delta=-user.cigarette_cost):
+                break
+        else:
+            raise ConcurrentUpdateError(telegram_id)
 
-    if last_event.id is not None:
-        event_repo.delete(last_event.id)
+        event_repo.delete(event.id)
+        stats_repo.increment(telegram_id, event.timestamp.date(), -1, -int(event.was_early), -user.cigarette_cost)
+
+
+async def execute_async(
+    telegram_id: int,
+    user_repo: AbstractAsyncUserRepository,
+    event_repo: AbstractAsyncSmokingEventRepository,
+    stats_repo: AbstractAsyncDailyStatsRepository,
+) -> None:
+    """Async variant of :func:`execute`."""
+    for _ in range(CAS_ATTEMPTS):
+        user = _check_user(await user_repo.get_by_telegram_id(telegram_id))
+        event = _apply(user, await event_repo.list_by_user(telegram_id, limit=2))
+        # persist changes to user before deleting event
+        if await user_repo.update_if_version(user, spent_delta=-user.cigarette_cost):
+            break
     else:
-        raise CannotUndo("Невозможно отменить — не найден идентификатор события")
-    # note: id not stored earlier; extend model? We'll not use id for now 
\ No newline at end of file
+        raise ConcurrentUpdateError(telegram_id)
+
+    await event_repo.delete(event.id)
+    await stats_repo.increment(telegram_id, event.timestamp.date(), -1, -int(event.was_early), -user.cigarette_cost)
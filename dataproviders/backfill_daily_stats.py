@@ -0,0 +1,57 @@
+"""One-off backfill of ``daily_user_stats`` from existing ``smoking_events``.
+
+Usage (stop the bot first so no events are registered meanwhile)::
+
+    python -m no_quitting_bot.dataproviders.backfill_daily_stats
+"""
+
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import case, delete, func, insert, select
+
+from no_quitting_bot.dataproviders.db import run_migrations, session_scope
+from no_quitting_bot.dataproviders.repositories._models import (
+    DailyUserStatsModel,
+    SmokingEventModel,
+    UserModel,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def backfill() -> int:
+    """Rebuild the whole rollup in one transaction; returns the number of rows written."""
+    day = func.date(SmokingEventModel.timestamp)
+    smoked = func.count(SmokingEventModel.id)
+    aggregated = (
+        select(
+            SmokingEventModel.user_id,
+            day,
+            smoked,
+            func.sum(case((SmokingEventModel.was_early, 1), else_=0)),
+            smoked * func.coalesce(func.max(UserModel.cigarette_cost), 0.0),
+        )
+        .outerjoin(UserModel, UserModel.telegram_id == SmokingEventModel.user_id)
+        .group_by(SmokingEventModel.user_id, day)
+    )
+    with session_scope() as session:
+        session.execute(delete(DailyUserStatsModel))
+        result = session.execute(
+            insert(DailyUserStatsModel).from_select(
+                ["user_id", "day", "smoked", "early", "spent"], aggregated
+            )
+        )
+        return result.rowcount
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    run_migrations()
+    rows = backfill()
+    logger.info("daily_user_stats backfilled: %d rows", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,33 +2,121 @@
 
 from __future__ import annotations
 
+import logging
 import os
-from contextlib import contextmanager
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Iterator
+from typing import Any, AsyncIterator, Callable, Iterator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker, DeclarativeBase
+from sqlalchemy import Connection, Engine, create_engine, event, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.orm import Session, scoped_session, sessionmaker, DeclarativeBase
 from sqlalchemy import text
 
+from no_quitting_bot.core.interfaces.unit_of_work import AbstractUnitOfWork
+from no_quitting_bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
 # ---------------------------------------------------------------------------
 # Constants & Helpers
 # ---------------------------------------------------------------------------
 DB_FILENAME = os.getenv("QS_DB_FILENAME", "no_quitting_bot.db")
 DB_PATH = Path(DB_FILENAME).expanduser().absolute()
 
+# SQLite only: the engine profiles and the migration runner below rely on
+# SQLite (PRAGMAs, BEGIN IMMEDIATE). Both engines open the same file; only
+# the driver differs.
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 
-# SQLite specific pragmas for better performance / safety
-_engine_kwargs = {
-    "connect_args": {"check_same_thread": False},  # needed for SQLite + threads
+# ---------------------------------------------------------------------------
+# Engine profiles
+# ---------------------------------------------------------------------------
+# Selected with QS_DB_PROFILE. "default" keeps stock SQLite behaviour, "tuned"
+# enables WAL (readers never block the writer), relaxed fsync, a busy timeout
+# instead of immediate "database is locked", memory-mapped I/O and a larger
+# page cache.
+SQLITE_PROFILES: dict[str, dict[str, Any]] = {
+    "default": {
+        "pragmas": {},
+        "pool": None,  # SQLAlchemy's defaults for the driver
+    },
+    "tuned": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,  # ms
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,  # KiB (negative = size, not pages)
+            "temp_store": "MEMORY",
+        },
+        "pool": {"pool_size": 10, "max_overflow": 20},
+    },
 }
+DB_PROFILE = os.getenv("QS_DB_PROFILE", "tuned")
+
+
+def _install_pragmas(target_engine: Engine, pragmas: dict[str, Any]) -> None:
+    """Apply ``PRAGMA``s on every new DBAPI connection of ``target_engine``."""
+    if not pragmas or target_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:  # noqa: ANN001
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
+
+
+def _profile(name: str) -> dict[str, Any]:
+    try:
+        return SQLITE_PROFILES[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown QS_DB_PROFILE {name!r}; expected one of {sorted(SQLITE_PROFILES)}") from None
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, profile: str = DB_PROFILE) -> Engine:
+    """Sync engine configured with the given profile."""
+    cfg = _profile(profile)
+    kwargs: dict[str, Any] = {}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}  # needed for SQLite + threads
+        kwargs.update(cfg["pool"] or {})
+    new_engine = create_engine(url, echo=False, future=True, **kwargs)
+    _install_pragmas(new_engine, cfg["pragmas"])
+    return new_engine
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=False, future=True, **_engine_kwargs)
+
+def make_async_engine(url: str = ASYNC_SQLALCHEMY_DATABASE_URL, profile: str = DB_PROFILE) -> AsyncEngine:
+    """Async engine configured with the given profile."""
+    cfg = _profile(profile)
+    kwargs: dict[str, Any] = {}
+    if url.startswith("sqlite") and cfg["pool"]:
+        # aiosqlite defaults to NullPool: a new connection (and worker thread) per session
+        kwargs["poolclass"] = AsyncAdaptedQueuePool
+        kwargs.update(cfg["pool"])
+    new_engine = create_async_engine(url, echo=False, **kwargs)
+    _install_pragmas(new_engine.sync_engine, cfg["pragmas"])
+    return new_engine
+
+
+engine = make_engine()
 
 # Configure Session class
 SessionLocal = scoped_session(sessionmaker(bind=engine, autocommit=False, autoflush=False))
 
+# Async engine used by the bot handlers so DB I/O does not block the event loop
+async_engine = make_async_engine()
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 class Base(DeclarativeBase):
     """Base class for declarative models."""
@@ -36,7 +124,15 @@ class Base(DeclarativeBase):
 
 @contextmanager
 def session_scope() -> Iterator[scoped_session]:
-    """Provide a transactional scope around a series of operations."""
+    """Provide a transactional scope around a series of operations.
+
+    Inside a :class:`UnitOfWork` this yields its session and leaves commit and
+    rollback to the unit of work.
+    """
+    uow = _current_sync_uow.get()
+    if uow is not None:
+        yield uow.session
+        return
     session = SessionLocal()
     try:
         yield session
@@ -47,27 +143,281 @@ def session_scope() -> Iterator[scoped_session]:
     finally:
         session.close()
 
+
+class UnitOfWork(AbstractUnitOfWork):
+    """Sync counterpart of :class:`AsyncUnitOfWork` for scripts and tests.
+
+    While active, :func:`session_scope` hands out its session, so the
+    repository calls made inside share one transaction, committed on exit.
+    """
+
+    def __init__(self) -> None:
+        self.session: Session | None = None
+        self._token = None
+
+    def __enter__(self) -> "UnitOfWork":
+        self.session = SessionLocal.session_factory()
+        self._token = _current_sync_uow.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        _current_sync_uow.reset(self._token)
+        try:
+            if exc_type is None:
+                self.session.commit()
+            else:
+                self.session.rollback()
+        finally:
+            self.session.close()
+
+
+_current_sync_uow: ContextVar[UnitOfWork | None] = ContextVar("qs_sync_unit_of_work", default=None)
+
+
 # ---------------------------------------------------------------------------
-# Simple migration helper (SQLite only)
+# Request-scoped unit of work
 # ---------------------------------------------------------------------------
 
 
-def _add_column_if_missing(table: str, column_name: str, column_def: str) -> None:
-    """Add column to SQLite table if it doesn't exist."""
+class AsyncUnitOfWork:
+    """One session, one transaction and one identity map per Telegram update.
+
+    While a unit of work is active, :func:`async_session_scope` hands out its
+    session instead of opening a new one, so every repository call made while
+    handling the update shares a single transaction that is committed once on
+    exit. ``query_count`` is the number of SQL statements executed inside it.
+    """
+
+    def __init__(self) -> None:
+        self.session: AsyncSession | None = None
+        self.identity_map: dict[tuple[type, Any], Any] = {}
+        self.query_count = 0
+        self._token = None
+
+    async def __aenter__(self) -> "AsyncUnitOfWork":
+        self.session = AsyncSessionLocal()
+        self._token = _current_uow.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        _current_uow.reset(self._token)
+        try:
+            if exc_type is None:
+                await self.session.commit()
+            else:
+                await self.session.rollback()
+        finally:
+            await self.session.close()
+            self.identity_map.clear()
+
+    async def commit(self) -> None:
+        """Commit what was done so far; later statements start a new transaction."""
+        if self.session.in_transaction():
+            await self.session.commit()
+
+    def get(self, kind: type, key: Any) -> Any:
+        return self.identity_map.get((kind, key))
+
+    def put(self, kind: type, key: Any, obj: Any) -> None:
+        self.identity_map[(kind, key)] = obj
+
+    def discard(self, kind: type, key: Any) -> None:
+        self.identity_map.pop((kind, key), None)
+
+
+_current_uow: ContextVar[AsyncUnitOfWork | None] = ContextVar("qs_unit_of_work", default=None)
+
+
+def current_unit_of_work() -> AsyncUnitOfWork | None:
+    """Return the unit of work bound to the running task, if any."""
+    return _current_uow.get()
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    uow = _current_uow.get()
+    if uow is not None:
+        uow.query_count += 1
+
+
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    if context is not None:
+        context._qs_started = time.perf_counter()
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    started = getattr(context, "_qs_started", None)
+    if started is None:
+        return
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    metrics.SQL_STATEMENTS.inc(kind)
+    metrics.SQL_SECONDS.observe(time.perf_counter() - started, kind)
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _start_statement_timer)
+    event.listen(_engine, "after_cursor_execute", _record_statement)
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of :func:`session_scope`.
+
+    Inside an active :class:`AsyncUnitOfWork` the shared session is yielded and
+    committing is left to the unit of work.
+    """
+    uow = _current_uow.get()
+    if uow is not None:
+        yield uow.session
+        return
+
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+# ---------------------------------------------------------------------------
+# Versioned migrations (SQLite only)
+# ---------------------------------------------------------------------------
+# The applied version is kept in the one-row ``schema_version`` table. When it
+# equals len(MIGRATIONS), startup costs a single SELECT. Otherwise, in one
+# transaction, missing tables are created and the pending steps run in order.
+# Steps must stay idempotent: databases created before this runner start at
+# version 0 and already have some of the changes. New columns, indexes and
+# tables (including new models, which ``create_all`` only picks up on the
+# slow path) need a new step appended to MIGRATIONS; never edit or reorder
+# existing ones.
+
+
+def _add_column_if_missing(conn: Connection, table: str, column_name: str, column_def: str) -> bool:
+    """Add column to SQLite table if it doesn't exist. Returns True if added."""
+    cols = conn.execute(text(f"PRAGMA table_info({table})")).fetchall()
+    if column_name not in [c[1] for c in cols]:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_def}"))
+        return True
+    return False
+
+
+def _create_index_if_missing(conn: Connection, name: str, table: str, columns: str) -> None:
+    """Create an index on an existing table (``create_all`` only indexes new tables)."""
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _m001_user_settings(conn: Connection) -> None:
+    _add_column_if_missing(conn, "users", "last_delay_offer", "DATETIME")
+    _add_column_if_missing(conn, "users", "growth_pause_until", "DATETIME")
+    _add_column_if_missing(conn, "users", "target_cigs_per_day", "INTEGER")
+    _add_column_if_missing(conn, "users", "days_success_streak", "INTEGER DEFAULT 0")
+
+
+def _m002_event_flags(conn: Connection) -> None:
+    _add_column_if_missing(conn, "smoking_events", "via_bonus_token", "BOOLEAN DEFAULT 0")
+    _add_column_if_missing(conn, "smoking_events", "alternative_done", "BOOLEAN DEFAULT 0")
+
+
+def _m003_event_history_index(conn: Connection) -> None:
+    _create_index_if_missing(conn, "ix_smoking_events_user_id_timestamp", "smoking_events", "user_id, timestamp")
+
+
+def _m004_last_event_at(conn: Connection) -> None:
+    if _add_column_if_missing(conn, "users", "last_event_at", "DATETIME"):
+        # Backfill the denormalized "latest event" timestamp once
+        conn.execute(
+            text(
+                "UPDATE users SET last_event_at = "
+                "(SELECT MAX(timestamp) FROM smoking_events WHERE smoking_events.user_id = users.telegram_id)"
+            )
+        )
+    _create_index_if_missing(conn, "ix_users_last_event_at", "users", "last_event_at")
+
+
+def _m005_user_row_version(conn: Connection) -> None:
+    _add_column_if_missing(conn, "users", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _m006_last_seen_at(conn: Connection) -> None:
+    _add_column_if_missing(conn, "users", "last_seen_at", "DATETIME")
+    _create_index_if_missing(conn, "ix_users_last_seen_at", "users", "last_seen_at")
+
+
+def _m007_next_allowed_time_index(conn: Connection) -> None:
+    _create_index_if_missing(conn, "ix_users_next_allowed_time", "users", "next_allowed_time")
+
+
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    _m001_user_settings,
+    _m002_event_flags,
+    _m003_event_history_index,
+    _m004_last_event_at,
+    _m005_user_row_version,
+    _m006_last_seen_at,
+    _m007_next_allowed_time_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _schema_version(conn: Connection) -> int:
+    try:
+        return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+    except OperationalError:  # no such table: fresh or pre-versioning database
+        return 0
+
+
+@contextmanager
+def _migration_transaction() -> Iterator[Connection]:
+    """One write transaction for the whole upgrade.
+
+    pysqlite only opens transactions implicitly before DML, so DDL would be
+    autocommitted statement by statement; driver-level autocommit plus an
+    explicit ``BEGIN IMMEDIATE`` makes the DDL transactional too, and makes
+    concurrently starting processes wait for each other.
+    """
     with engine.connect() as conn:
-        cols = conn.execute(text(f"PRAGMA table_info({table})")).fetchall()
-        if column_name not in [c[1] for c in cols]:
-            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_def}"))
-
-
-def run_migrations() -> None:
-    """Run simple migrations to add new columns if needed."""
-    # Add water tracking columns
-    _add_column_if_missing("users", "last_delay_offer", "DATETIME")
-    _add_column_if_missing("users", "growth_pause_until", "DATETIME")
-    _add_column_if_missing("users", "target_cigs_per_day", "INTEGER")
-    _add_column_if_missing("users", "days_success_streak", "INTEGER DEFAULT 0")
-
-    # Smoking events additions
-    _add_column_if_missing("smoking_events", "via_bonus_token", "BOOLEAN DEFAULT 0")
-    _add_column_if_missing("smoking_events", "alternative_done", "BOOLEAN DEFAULT 0") 
\ No newline at end of file
+        dbapi_connection = conn.connection.driver_connection
+        isolation_level = dbapi_connection.isolation_level
+        dbapi_connection.isolation_level = None
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        finally:
+            dbapi_connection.isolation_level = isolation_level
+
+
+def run_migrations() -> int:
+    """Bring the schema to SCHEMA_VERSION; returns the number of steps applied.
+
+    Call once at startup, not at import time.
+    """
+    from no_quitting_bot.dataproviders.repositories import _models  # noqa: F401  (registers the tables)
+
+    with engine.connect() as conn:
+        if _schema_version(conn) == SCHEMA_VERSION:
+            return 0
+
+    with _migration_transaction() as conn:
+        current = _schema_version(conn)  # another process may have migrated meanwhile
+        if current == SCHEMA_VERSION:
+            return 0
+        if current > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema version {current} is newer than this code ({SCHEMA_VERSION})")
+        fresh = not inspect(conn).has_table("users")
+        Base.metadata.create_all(conn)
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        pending = [] if fresh else MIGRATIONS[current:]  # create_all already built the current schema
+        for step in pending:
+            logger.info("Applying migration %s", step.__name__)
+            step(conn)
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": SCHEMA_VERSION})
+    logger.info("Database schema upgraded from version %d to %d", current, SCHEMA_VERSION)
+    return len(pending)
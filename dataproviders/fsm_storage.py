@@ -0,0 +1,144 @@
+"""aiogram FSM storage persisted in the project database.
+
+States live in the ``fsm_states`` table so onboarding survives restarts and
+can be picked up by any worker process. Reads are cached for the lifetime
+of the current unit of work, i.e. one Telegram update, so repeated lookups
+while handling it cost one query and a worker never acts on a state another
+worker has since changed. Writes go straight into the update's transaction:
+once the update is handled, every worker sees the new state.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import datetime as dt
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from no_quitting_bot.dataproviders.db import async_session_scope, current_unit_of_work
+from no_quitting_bot.dataproviders.repositories._models import FSMStateModel
+
+logger = logging.getLogger(__name__)
+
+STATE_TTL = dt.timedelta(days=7)  # abandoned onboardings are dropped after this
+CLEANUP_INTERVAL_SECONDS = 3600.0
+
+
+@dataclass(slots=True)
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+def _storage_key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class SqlAlchemyStorage(BaseStorage):
+    """Database-backed FSM storage with a per-update read cache."""
+
+    def __init__(self, state_ttl: dt.timedelta = STATE_TTL) -> None:
+        self.state_ttl = state_ttl
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cleaner: asyncio.Task | None = None
+
+    # ------------------------------------------------------------------
+    # BaseStorage API
+    # ------------------------------------------------------------------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._load(key)
+        new_state = state.state if isinstance(state, State) else state
+        await self._save(key, _Record(state=new_state, data=record.data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._load(key)
+        await self._save(key, _Record(state=record.state, data=dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._load(key)).data)
+
+    async def close(self) -> None:
+        if self._cleaner is not None:
+            self._cleaner.cancel()
+            self._cleaner = None
+
+    # ------------------------------------------------------------------
+    # Cache / persistence
+    # ------------------------------------------------------------------
+
+    async def _load(self, key: StorageKey) -> _Record:
+        skey = _storage_key(key)
+        uow = current_unit_of_work()
+        if uow is not None and (record := uow.get(_Record, skey)) is not None:
+            self.cache_hits += 1
+            return record
+
+        self.cache_misses += 1
+        async with async_session_scope() as session:
+            row = await session.get(FSMStateModel, skey, populate_existing=True)
+            record = _Record(state=row.state, data=json.loads(row.data)) if row else _Record()
+        if uow is not None:
+            uow.put(_Record, skey, record)
+        return record
+
+    async def _save(self, key: StorageKey, record: _Record) -> None:
+        skey = _storage_key(key)
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.put(_Record, skey, record)
+        async with async_session_scope() as session:
+            if record.empty:
+                await session.execute(delete(FSMStateModel).where(FSMStateModel.key == skey))
+            else:
+                insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+                stmt = insert(FSMStateModel).values(
+                    key=skey, state=record.state, data=json.dumps(record.data), updated_at=dt.datetime.utcnow()
+                )
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[FSMStateModel.key],
+                        set_={
+                            "state": stmt.excluded.state,
+                            "data": stmt.excluded.data,
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    )
+                )
+        self._ensure_cleaner()
+
+    def _ensure_cleaner(self) -> None:
+        if self._cleaner is None or self._cleaner.done():
+            # fresh context: the cleaner must not inherit the current update's unit of work
+            self._cleaner = asyncio.create_task(self._cleanup_loop(), context=contextvars.Context())
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+            try:
+                await self.cleanup()
+            except Exception as e:
+                logger.warning("FSM storage cleanup failed: %s", e)
+
+    async def cleanup(self) -> int:
+        """Delete states not touched for ``state_ttl``; returns the number of rows removed."""
+        cutoff = dt.datetime.utcnow() - self.state_ttl
+        async with async_session_scope() as session:
+            result = await session.execute(delete(FSMStateModel).where(FSMStateModel.updated_at < cutoff))
+        return result.rowcount
@@ -0,0 +1,135 @@
+"""Leader election through a lease row in the project database.
+
+Every process competes for the same named lease. The holder renews it every
+``heartbeat_interval`` seconds; if it stops doing so (crash, network split,
+stuck event loop) the lease expires after ``ttl`` seconds and another process
+takes over. Acquiring and renewing is a single conditional upsert, so two
+processes can never both believe they hold an unexpired lease. Expiry uses
+wall-clock time, so hosts are expected to keep their clocks in sync (NTP).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from no_quitting_bot.dataproviders.db import async_session_scope
+from no_quitting_bot.dataproviders.repositories._models import LeaseModel
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL_SECONDS = 30.0
+HEARTBEAT_INTERVAL_SECONDS = 10.0
+
+
+def _default_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def _call(callback: Optional[Callable[[], Any]]) -> None:
+    if callback is None:
+        return
+    result = callback()
+    if inspect.isawaitable(result):
+        await result
+
+
+class LeaderLease:
+    """Hold the lease ``name`` while this process is alive.
+
+    Usage::
+
+        lease = LeaderLease("scheduler")
+        task = asyncio.create_task(lease.run(on_acquired=..., on_lost=...))
+        ...
+        task.cancel()
+        await lease.release()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = LEASE_TTL_SECONDS,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS,
+        holder_id: str | None = None,
+    ) -> None:
+        if heartbeat_interval >= ttl:
+            raise ValueError("heartbeat_interval must be shorter than the lease ttl")
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.holder_id = holder_id or _default_holder_id()
+        self._expires_at = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        """True while we hold a lease that has not expired yet."""
+        return self._expires_at > time.time()
+
+    async def try_acquire(self) -> bool:
+        """Take over a free or expired lease, or renew our own. Returns leadership."""
+        now = time.time()
+        expires_at = now + self.ttl
+        async with async_session_scope() as session:
+            insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+            stmt = insert(LeaseModel).values(name=self.name, holder=self.holder_id, expires_at=expires_at)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[LeaseModel.name],
+                    set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+                    where=or_(LeaseModel.holder == self.holder_id, LeaseModel.expires_at < now),
+                )
+            )
+            holder = await session.scalar(select(LeaseModel.holder).where(LeaseModel.name == self.name))
+        self._expires_at = expires_at if holder == self.holder_id else 0.0
+        return self._expires_at > 0
+
+    async def release(self) -> None:
+        """Give the lease up so another process can take over immediately."""
+        self._expires_at = 0.0
+        async with async_session_scope() as session:
+            await session.execute(
+                delete(LeaseModel).where(LeaseModel.name == self.name, LeaseModel.holder == self.holder_id)
+            )
+
+    async def run(
+        self,
+        on_acquired: Optional[Callable[[], Any]] = None,
+        on_lost: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """Compete for the lease until cancelled, reporting leadership changes."""
+        leading = False
+        try:
+            while True:
+                try:
+                    await self.try_acquire()
+                except Exception as e:
+                    # keep leading until our current lease runs out
+                    logger.warning("Lease %s heartbeat failed: %s", self.name, e)
+
+                if self.is_leader and not leading:
+                    leading = True
+                    logger.info("Lease %s acquired by %s", self.name, self.holder_id)
+                    await _call(on_acquired)
+                elif not self.is_leader and leading:
+                    leading = False
+                    logger.warning("Lease %s lost by %s", self.name, self.holder_id)
+                    await _call(on_lost)
+
+                delay = self.heartbeat_interval
+                if leading:
+                    # wake up in time to step down if renewals keep failing
+                    delay = min(delay, max(self._expires_at - time.time(), 0.0))
+                await asyncio.sleep(delay)
+        finally:
+            if leading:
+                await _call(on_lost)
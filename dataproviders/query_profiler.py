@@ -0,0 +1,187 @@
+"""Opt-in SQL profiler: attribute statements to the current update or job.
+
+Enabled with ``QS_SQL_PROFILE=1``. A :func:`profile_scope` (entered by the
+update middleware and by :func:`profiled` jobs) collects, per statement
+fingerprint, how many times it ran and for how long. On exit a warning with
+the top fingerprints is logged when the scope ran more than
+``QS_SQL_PROFILE_MAX_QUERIES`` statements, took more than
+``QS_SQL_PROFILE_MAX_MS`` in SQL, or repeated one statement shape more than
+``QS_SQL_PROFILE_REPEAT`` times (the usual N+1 signature).
+
+Statements executed outside a scope are ignored. When disabled no engine
+listeners are installed at all.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from sqlalchemy import Engine, event
+
+from no_quitting_bot.dataproviders.db import async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("QS_SQL_PROFILE", "0") == "1"
+MAX_QUERIES = int(os.getenv("QS_SQL_PROFILE_MAX_QUERIES", "20"))
+MAX_SECONDS = float(os.getenv("QS_SQL_PROFILE_MAX_MS", "500")) / 1000
+MAX_REPEATS = int(os.getenv("QS_SQL_PROFILE_REPEAT", "5"))
+REPORT_TOP = 5
+FINGERPRINT_CACHE_SIZE = 1024
+
+_IN_LIST = re.compile(r"\?(?:\s*,\s*\?)+")  # expanded IN (?, ?, ...) of any length
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES = re.compile(r"\s+")
+# column lists carry no information about the access pattern
+_COLUMN_LISTS = (
+    (re.compile(r"^SELECT (?:DISTINCT )?.+? FROM ", re.S), "SELECT ... FROM "),
+    (re.compile(r"^INSERT INTO (\S+) \(.*?\) VALUES \(.*?\)", re.S), r"INSERT INTO \1 (...) VALUES (...)"),
+    (re.compile(r" SET .+? WHERE ", re.S), " SET ... WHERE "),
+    (re.compile(r" RETURNING .+$", re.S), " RETURNING ..."),
+)
+_fingerprints: dict[str, str] = {}
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def fingerprint(statement: str) -> str:
+    """Statement shape: literals, IN-list lengths and column lists folded."""
+    shape = _fingerprints.get(statement)
+    if shape is None:
+        shape = _SPACES.sub(" ", _LITERAL.sub("?", statement)).strip()
+        shape = _IN_LIST.sub("?, ...", shape)
+        for pattern, replacement in _COLUMN_LISTS:
+            shape = pattern.sub(replacement, shape, count=1)
+        if len(_fingerprints) >= FINGERPRINT_CACHE_SIZE:
+            _fingerprints.clear()
+        _fingerprints[statement] = shape
+    return shape
+
+
+@dataclass(slots=True)
+class _Shape:
+    count: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class QueryProfile:
+    label: str
+    count: int = 0
+    seconds: float = 0.0
+    shapes: dict[str, _Shape] = field(default_factory=dict)
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        shape = self.shapes.get(statement)  # keyed by raw text; folded only when reporting
+        if shape is None:
+            shape = self.shapes[statement] = _Shape()
+        shape.count += 1
+        shape.seconds += seconds
+
+    def grouped(self) -> list[tuple[str, _Shape]]:
+        """Per-fingerprint totals, most frequent first."""
+        groups: dict[str, _Shape] = {}
+        for statement, shape in self.shapes.items():
+            total = groups.setdefault(fingerprint(statement), _Shape())
+            total.count += shape.count
+            total.seconds += shape.seconds
+        return sorted(groups.items(), key=lambda item: (-item[1].count, -item[1].seconds))
+
+    def problems(self, grouped: list[tuple[str, _Shape]]) -> list[str]:
+        found = []
+        if self.count > MAX_QUERIES:
+            found.append(f"{self.count} queries > {MAX_QUERIES}")
+        if self.seconds > MAX_SECONDS:
+            found.append(f"{self.seconds * 1000:.0f} ms > {MAX_SECONDS * 1000:.0f} ms")
+        if grouped and grouped[0][1].count > MAX_REPEATS:
+            found.append(f"same statement {grouped[0][1].count}x > {MAX_REPEATS} (N+1?)")
+        return found
+
+    def report(self) -> None:
+        grouped = self.grouped()
+        problems = self.problems(grouped)
+        if not problems:
+            logger.debug("SQL profile %s: %d queries in %.1f ms", self.label, self.count, self.seconds * 1000)
+            return
+        lines = [f"  {s.count:>4}x {s.seconds * 1000:>8.1f} ms  {shape[:160]}" for shape, s in grouped[:REPORT_TOP]]
+        logger.warning(
+            "SQL profile %s: %d queries in %.1f ms (%s)\n%s",
+            self.label,
+            self.count,
+            self.seconds * 1000,
+            "; ".join(problems),
+            "\n".join(lines),
+        )
+
+
+_current_profile: ContextVar[QueryProfile | None] = ContextVar("qs_query_profile", default=None)
+
+
+@contextmanager
+def profile_scope(label: str) -> Iterator[QueryProfile | None]:
+    """Attribute statements run inside the block (and tasks it spawns) to ``label``.
+
+    Nested scopes are folded into the outermost one. Yields ``None`` when the
+    profiler is disabled.
+    """
+    if not ENABLED or _current_profile.get() is not None:
+        yield _current_profile.get()
+        return
+    profile = QueryProfile(label)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        profile.report()
+
+
+def profiled(label: str) -> Callable[[F], F]:
+    """Decorator running an async job inside :func:`profile_scope`."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with profile_scope(label):
+                return await func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Engine events
+# ---------------------------------------------------------------------------
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    if context is not None and _current_profile.get() is not None:
+        context._qs_profile_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    started = getattr(context, "_qs_profile_started", None)
+    profile = _current_profile.get()
+    if started is not None and profile is not None:
+        profile.add(statement, time.perf_counter() - started)
+
+
+def install(target: Engine) -> None:
+    event.listen(target, "before_cursor_execute", _before_execute)
+    event.listen(target, "after_cursor_execute", _after_execute)
+
+
+if ENABLED:
+    for _engine in (engine, async_engine.sync_engine):
+        install(_engine)
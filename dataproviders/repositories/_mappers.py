@@ -0,0 +1,128 @@
+"""Conversions between ORM models and domain entities.
+
+Shared by the sync and async repository implementations.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any
+
+from no_quitting_bot.core.entities.daily_stats import DailyStats
+from no_quitting_bot.core.entities.smoking_event import SmokingEvent
+from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.dataproviders.repositories._models import (
+    DailyUserStatsModel,
+    SmokingEventModel,
+    UserModel,
+)
+
+
+def _date_to_datetime(value: dt.date | None) -> dt.datetime | None:
+    return dt.datetime.combine(value, dt.time()) if value else None
+
+
+def user_to_entity(model: UserModel) -> User:
+    return User(
+        telegram_id=model.telegram_id,
+        cigarettes_per_day=model.cigarettes_per_day,
+        cigarette_cost=model.cigarette_cost,
+        interval_minutes=model.interval_minutes,
+        last_interval_update=model.last_interval_update,
+        next_allowed_time=model.next_allowed_time,
+        early_counter=model.early_counter,
+        spent=model.spent,
+        savings=model.savings,
+        hub_message_id=model.hub_message_id,
+        last_event_at=model.last_event_at,
+        last_delay_offer=model.last_delay_offer,
+        growth_pause_until=model.growth_pause_until.date() if model.growth_pause_until else None,
+        target_cigs_per_day=model.target_cigs_per_day,
+        days_success_streak=model.days_success_streak,
+        version=model.version or 0,
+    )
+
+
+def user_to_model(user: User) -> UserModel:
+    model = UserModel(telegram_id=user.telegram_id)
+    update_user_model(model, user)
+    return model
+
+
+# Mutable ``users`` columns, i.e. everything written back on update
+USER_VALUE_COLUMNS: tuple[str, ...] = (
+    "cigarettes_per_day",
+    "cigarette_cost",
+    "interval_minutes",
+    "last_interval_update",
+    "next_allowed_time",
+    "early_counter",
+    "spent",
+    "savings",
+    "hub_message_id",
+    "last_event_at",
+    "last_delay_offer",
+    "growth_pause_until",
+    "target_cigs_per_day",
+    "days_success_streak",
+)
+
+
+# Columns a conditional (compare-and-swap) update writes from the entity;
+# ``spent`` is adjusted relative to the stored value instead
+USER_STATE_COLUMNS: tuple[str, ...] = tuple(c for c in USER_VALUE_COLUMNS if c != "spent")
+
+# Columns the nightly adaptive growth changes; its batched write touches nothing else
+USER_GROWTH_COLUMNS: tuple[str, ...] = (
+    "interval_minutes",
+    "last_interval_update",
+    "growth_pause_until",
+    "target_cigs_per_day",
+    "days_success_streak",
+)
+
+
+def user_to_values(entity: User) -> dict[str, Any]:
+    values = {name: getattr(entity, name) for name in USER_VALUE_COLUMNS}
+    values["growth_pause_until"] = _date_to_datetime(entity.growth_pause_until)
+    return values
+
+
+def update_user_model(model: UserModel, entity: User) -> None:
+    for key, value in user_to_values(entity).items():
+        setattr(model, key, value)
+
+
+def event_to_entity(model: SmokingEventModel) -> SmokingEvent:
+    return SmokingEvent(
+        id=model.id,
+        user_id=model.user_id,
+        timestamp=model.timestamp,
+        planned_time=model.planned_time,
+        was_early=model.was_early,
+        interval_before=model.interval_before,
+        via_bonus_token=model.via_bonus_token,
+        alternative_done=model.alternative_done,
+    )
+
+
+def event_to_model(event: SmokingEvent) -> SmokingEventModel:
+    return SmokingEventModel(
+        user_id=event.user_id,
+        timestamp=event.timestamp,
+        planned_time=event.planned_time,
+        was_early=event.was_early,
+        interval_before=event.interval_before,
+        via_bonus_token=event.via_bonus_token,
+        alternative_done=event.alternative_done,
+    )
+
+
+def daily_stats_to_entity(model: DailyUserStatsModel) -> DailyStats:
+    return DailyStats(
+        user_id=model.user_id,
+        day=model.day,
+        smoked=model.smoked,
+        early=model.early,
+        spent=model.spent,
+    )
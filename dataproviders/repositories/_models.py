@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import Column, Integer, Float, DateTime, Boolean, BigInteger
+from sqlalchemy import Column, Integer, Float, Date, DateTime, Boolean, BigInteger, Index, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from no_quitting_bot.dataproviders.db import Base
@@ -19,25 +19,76 @@ class UserModel(Base):
     cigarette_cost: Mapped[float] = mapped_column(Float, nullable=False)
     interval_minutes: Mapped[int] = mapped_column(Integer, nullable=False)
     last_interval_update: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
-    next_allowed_time: Mapped[dt.datetime | None] = mapped_column(DateTime, nullable=True)
+    next_allowed_time: Mapped[dt.datetime | None] = mapped_column(DateTime, nullable=True, index=True)
     early_counter: Mapped[int] = mapped_column(Integer, default=0)
     spent: Mapped[float] = mapped_column(Float, default=0.0)
     savings: Mapped[float] = mapped_column(Float, default=0.0)
     hub_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_event_at: Mapped[dt.datetime | None] = mapped_column(DateTime, nullable=True, index=True)
     last_delay_offer: Mapped[dt.datetime | None] = mapped_column(DateTime, nullable=True)
     growth_pause_until: Mapped[dt.date | None] = mapped_column(DateTime, nullable=True)
     target_cigs_per_day: Mapped[int | None] = mapped_column(Integer, nullable=True)
     days_success_streak: Mapped[int] = mapped_column(Integer, default=0)
+    # Last update received from the user (throttled); picks the hubs for the live countdown
+    last_seen_at: Mapped[dt.datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
 
 class SmokingEventModel(Base):
     __tablename__ = "smoking_events"
+    # Serves per-user range scans (today/week counts) and "latest event" lookups
+    __table_args__ = (Index("ix_smoking_events_user_id_timestamp", "user_id", "timestamp"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     timestamp: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
     planned_time: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False)
     was_early: Mapped[bool] = mapped_column(Boolean, default=False)
     interval_before: Mapped[int] = mapped_column(Integer, nullable=False)
     via_bonus_token: Mapped[bool] = mapped_column(Boolean, default=False)
-    alternative_done: Mapped[bool] = mapped_column(Boolean, default=False) 
\ No newline at end of file
+    alternative_done: Mapped[bool] = mapped_column(Boolean, default=False) 
+
+
+class DailyUserStatsModel(Base):
+    """Rollup of ``smoking_events`` per user and UTC day, kept in sync by the use cases."""
+
+    __tablename__ = "daily_user_stats"
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    smoked: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    early: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    spent: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+
+
+class StateEntryModel(Base):
+    """Persisted entries of the TTL state stores (see ``dataproviders.state_store``)."""
+
+    __tablename__ = "state_entries"
+
+    namespace: Mapped[str] = mapped_column(String(64), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    value: Mapped[str] = mapped_column(Text, nullable=False)
+    expires_at: Mapped[float | None] = mapped_column(Float, nullable=True)  # unix time
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class FSMStateModel(Base):
+    """aiogram FSM state and data per storage key (see ``dataproviders.fsm_storage``)."""
+
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, nullable=False, default="{}")  # JSON
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+class LeaseModel(Base):
+    """Named leases used for leader election (see ``dataproviders.leader_lease``)."""
+
+    __tablename__ = "leases"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(128), nullable=False)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False)  # unix time
@@ -0,0 +1,36 @@
+"""Async SQLAlchemy implementation of the daily stats rollup repository."""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import List
+
+from no_quitting_bot.core.entities.daily_stats import DailyStats
+from no_quitting_bot.core.interfaces.repositories.daily_stats_repo import (
+    AbstractAsyncDailyStatsRepository,
+)
+from no_quitting_bot.dataproviders.db import async_session_scope
+from no_quitting_bot.dataproviders.repositories._mappers import daily_stats_to_entity
+from no_quitting_bot.dataproviders.repositories._models import DailyUserStatsModel
+from no_quitting_bot.dataproviders.repositories.daily_stats_repository import (
+    increment_stmt,
+    range_stmt,
+)
+
+
+class AsyncSqlAlchemyDailyStatsRepository(AbstractAsyncDailyStatsRepository):
+    """AsyncSession-based ``daily_user_stats`` repository used by the bot handlers."""
+
+    async def increment(self, user_id: int, day: dt.date, smoked: int, early: int, spent: float) -> None:
+        async with async_session_scope() as session:
+            await session.execute(increment_stmt(session.bind.dialect.name, user_id, day, smoked, early, spent))
+
+    async def get(self, user_id: int, day: dt.date) -> DailyStats | None:
+        async with async_session_scope() as session:
+            model = await session.get(DailyUserStatsModel, (user_id, day), populate_existing=True)
+            return daily_stats_to_entity(model) if model else None
+
+    async def list_between(self, user_id: int, start: dt.date, end: dt.date) -> List[DailyStats]:
+        async with async_session_scope() as session:
+            models = (await session.scalars(range_stmt(user_id, start, end))).all()
+            return [daily_stats_to_entity(m) for m in models]
@@ -0,0 +1,80 @@
+"""Async SQLAlchemy implementation of SmokingEvent repository."""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import AsyncIterator, List
+
+from sqlalchemy import delete, select
+
+from no_quitting_bot.core.entities.smoking_event import SmokingEvent
+from no_quitting_bot.core.interfaces.repositories.event_repo import (
+    AbstractAsyncSmokingEventRepository,
+)
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+from no_quitting_bot.dataproviders.db import async_session_scope
+from no_quitting_bot.dataproviders.repositories._mappers import event_to_entity, event_to_model
+from no_quitting_bot.dataproviders.repositories._models import SmokingEventModel
+from no_quitting_bot.dataproviders.repositories.event_repository import (
+    count_between_stmt,
+    events_page_stmt,
+    list_between_stmt,
+)
+
+
+class AsyncSqlAlchemySmokingEventRepository(AbstractAsyncSmokingEventRepository):
+    """AsyncSession-based SmokingEvent repository used by the bot handlers."""
+
+    async def add(self, event: SmokingEvent) -> None:
+        async with async_session_scope() as session:
+            model = event_to_model(event)
+            session.add(model)
+            await session.flush()
+            event.id = model.id
+
+    async def list_by_user(
+        self,
+        user_id: int,
+        limit: int | None = None,
+        after_timestamp: dt.datetime | None = None,
+        after_id: int | None = None,
+        newest_first: bool = True,
+    ) -> List[SmokingEvent]:
+        async with async_session_scope() as session:
+            stmt = events_page_stmt(user_id, limit, after_timestamp, after_id, newest_first)
+            models = (await session.scalars(stmt)).all()
+            return [event_to_entity(m) for m in models]
+
+    async def delete(self, event_id: int) -> None:
+        async with async_session_scope() as session:
+            await session.execute(delete(SmokingEventModel).where(SmokingEventModel.id == event_id))
+
+    async def get_last(self, user_id: int) -> SmokingEvent | None:
+        async with async_session_scope() as session:
+            model = await session.scalar(
+                select(SmokingEventModel)
+                .where(SmokingEventModel.user_id == user_id)
+                .order_by(SmokingEventModel.timestamp.desc())
+                .limit(1)
+            )
+            return event_to_entity(model) if model else None
+
+    async def count_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> int:
+        async with async_session_scope() as session:
+            return await session.scalar(count_between_stmt(user_id, start, end)) or 0
+
+    async def list_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> List[SmokingEvent]:
+        async with async_session_scope() as session:
+            models = (await session.scalars(list_between_stmt(user_id, start, end))).all()
+            return [event_to_entity(m) for m in models]
+
+    async def iter_by_user(
+        self, user_id: int, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[List[SmokingEvent]]:
+        events = await self.list_by_user(user_id, batch_size, newest_first=False)
+        while events:
+            yield events
+            if len(events) < batch_size:
+                return
+            last = events[-1]
+            events = await self.list_by_user(user_id, batch_size, last.timestamp, last.id, newest_first=False)
@@ -0,0 +1,35 @@
+"""Async SQLAlchemy implementation of the reporting repository."""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import AsyncIterator, List
+
+from no_quitting_bot.core.entities.report import UserPeriodCount
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+from no_quitting_bot.core.interfaces.repositories.report_repo import AbstractAsyncReportRepository
+from no_quitting_bot.dataproviders.db import async_session_scope
+from no_quitting_bot.dataproviders.repositories.report_repository import (
+    REPORT_USER_COLUMNS,
+    merge_counts,
+    period_counts_stmt,
+)
+from no_quitting_bot.dataproviders.repositories.user_repository import users_page_stmt
+
+
+class AsyncSqlAlchemyReportRepository(AbstractAsyncReportRepository):
+    """AsyncSession-based reporting queries used by scheduled jobs."""
+
+    async def iter_period_counts(
+        self, start: dt.date, end: dt.date, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[List[UserPeriodCount]]:
+        after: int | None = None
+        while True:
+            async with async_session_scope() as session:
+                users = (await session.execute(users_page_stmt(after, batch_size, columns=REPORT_USER_COLUMNS))).all()
+                if not users:
+                    return
+                first, last = users[0].telegram_id, users[-1].telegram_id
+                counts = (await session.execute(period_counts_stmt(first, last, start, end))).all()
+            yield merge_counts(users, counts)
+            after = last
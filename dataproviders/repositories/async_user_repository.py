@@ -0,0 +1,211 @@
+"""Async SQLAlchemy implementation of AbstractAsyncUserRepository."""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, AsyncIterator, Iterable, List, Tuple
+
+from sqlalchemy import ColumnElement, select
+
+from no_quitting_bot.core.entities.user import User
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    ConcurrentUpdateError,
+)
+from no_quitting_bot.dataproviders.db import async_session_scope, current_unit_of_work
+from no_quitting_bot.dataproviders.repositories._mappers import user_to_entity, user_to_model
+from no_quitting_bot.dataproviders.repositories._models import UserModel
+from no_quitting_bot.dataproviders.repositories.user_repository import (
+    adopt_columns,
+    bulk_update_growth_params,
+    bulk_update_growth_stmt,
+    bump_versions,
+    by_telegram_ids_stmts,
+    INACTIVE_START,
+    InactiveCursor,
+    inactive_page_stmt,
+    increment_spent_stmt,
+    mark_seen_stmt,
+    next_allowed_between_stmt,
+    next_inactive_cursor,
+    seen_since_stmt,
+    set_columns_stmt,
+    set_next_allowed_if_version_stmt,
+    update_if_version_stmt,
+    users_page_stmt,
+)
+
+
+class AsyncSqlAlchemyUserRepository(AbstractAsyncUserRepository):
+    """AsyncSession-based user repository used by the bot handlers.
+
+    Inside an active unit of work loaded users are kept in its identity map,
+    so repeated lookups of the same user within one update cost no queries.
+    Writes are single UPDATE statements; a failed compare-and-swap drops the
+    cached copy so the next lookup reloads the row.
+    """
+
+    async def get_by_telegram_id(self, telegram_id: int) -> User | None:
+        uow = current_unit_of_work()
+        if uow is not None and (cached := uow.get(User, telegram_id)) is not None:
+            return cached
+
+        async with async_session_scope() as session:
+            # the session may hold a copy from before a Core UPDATE in this unit of work
+            model: UserModel | None = await session.scalar(
+                select(UserModel)
+                .where(UserModel.telegram_id == telegram_id)
+                .execution_options(populate_existing=True)
+            )
+            if not model:
+                return None
+            user = user_to_entity(model)
+            if uow is not None:
+                uow.put(User, telegram_id, user)
+            return user
+
+    async def add(self, user: User) -> None:
+        uow = current_unit_of_work()
+        async with async_session_scope() as session:
+            model = user_to_model(user)
+            session.add(model)
+            # make the row visible to the Core UPDATEs below within the same unit of work
+            await session.flush()
+            if uow is not None:
+                uow.put(User, user.telegram_id, user)
+
+    async def update(self, user: User) -> None:
+        if not await self.update_if_version(user):
+            raise ConcurrentUpdateError(user.telegram_id)
+
+    async def update_if_version(self, user: User, spent_delta: float = 0.0) -> bool:
+        async with async_session_scope() as session:
+            row = (await session.execute(update_if_version_stmt(user, spent_delta))).one_or_none()
+        if row is None:
+            self._forget(user.telegram_id)
+            return False
+        user.spent, user.version = row
+        self._remember(user)
+        return True
+
+    async def increment_spent(self, telegram_id: int, amount: float) -> float:
+        async with async_session_scope() as session:
+            spent = await session.scalar(increment_spent_stmt(telegram_id, amount))
+        # the cached entity now has a stale spent/version
+        self._forget(telegram_id)
+        if spent is None:
+            raise ValueError("User not found")
+        return spent
+
+    async def set_next_allowed_if_version(self, user: User, next_allowed_time: dt.datetime) -> bool:
+        async with async_session_scope() as session:
+            version = await session.scalar(set_next_allowed_if_version_stmt(user, next_allowed_time))
+        if version is None:
+            self._forget(user.telegram_id)
+            return False
+        user.next_allowed_time, user.version = next_allowed_time, version
+        self._remember(user)
+        return True
+
+    def iter_all(self, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[List[User]]:
+        return self._iter_pages(batch_size)
+
+    async def list_by_telegram_ids(self, telegram_ids: Iterable[int]) -> List[User]:
+        async with async_session_scope() as session:
+            return [
+                user_to_entity(m)
+                for stmt in by_telegram_ids_stmts(telegram_ids)
+                for m in (await session.scalars(stmt)).all()
+            ]
+
+    async def iter_inactive(
+        self, before: dt.datetime, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> AsyncIterator[List[User]]:
+        cursor: InactiveCursor | None = INACTIVE_START
+        while cursor is not None:
+            async with async_session_scope() as session:
+                models = (await session.scalars(inactive_page_stmt(before, batch_size, cursor))).all()
+                users = [user_to_entity(m) for m in models]
+                cursor = next_inactive_cursor(cursor, models, batch_size)
+            if users:
+                yield users
+
+    async def bulk_update_growth(self, users: Iterable[User]) -> List[int]:
+        users = list(users)
+        if not users:
+            return []
+        stmt = bulk_update_growth_stmt()
+        async with async_session_scope() as session:
+            stale = []
+            for params in bulk_update_growth_params(users):
+                if (await session.execute(stmt, params)).rowcount == 0:
+                    stale.append(params["b_telegram_id"])
+        bump_versions(users, stale)
+        return stale
+
+    async def set_hub_message_id(self, user: User, message_id: int) -> None:
+        await self._set_columns(user, hub_message_id=message_id)
+
+    async def set_last_delay_offer(self, user: User, offered_at: dt.datetime) -> None:
+        await self._set_columns(user, last_delay_offer=offered_at)
+
+    async def bump_version(self, user: User) -> None:
+        await self._set_columns(user)
+
+    async def mark_seen(self, telegram_id: int, seen_at: dt.datetime) -> bool:
+        async with async_session_scope() as session:
+            return (await session.execute(mark_seen_stmt(telegram_id, seen_at))).rowcount > 0
+
+    async def list_seen_since(self, since: dt.datetime) -> List[User]:
+        async with async_session_scope() as session:
+            return [user_to_entity(m) for m in (await session.scalars(seen_since_stmt(since))).all()]
+
+    async def list_next_allowed_between(
+        self, after: dt.datetime, until: dt.datetime
+    ) -> List[Tuple[int, dt.datetime]]:
+        async with async_session_scope() as session:
+            return [tuple(row) for row in await session.execute(next_allowed_between_stmt(after, until))]
+
+    @staticmethod
+    async def _iter_pages(batch_size: int, *criteria: ColumnElement[bool]) -> AsyncIterator[List[User]]:
+        # Keyset pages in short sessions rather than one streamed result: the
+        # scheduled jobs await Telegram between chunks, and aiosqlite has no
+        # server-side cursor anyway.
+        after: int | None = None
+        while True:
+            async with async_session_scope() as session:
+                models = (await session.scalars(users_page_stmt(after, batch_size, *criteria))).all()
+                users = [user_to_entity(m) for m in models]
+            if users:
+                yield users
+            if len(users) < batch_size:
+                return
+            after = users[-1].telegram_id
+
+    async def _set_columns(self, user: User, **values: Any) -> None:
+        async with async_session_scope() as session:
+            version = await session.scalar(set_columns_stmt(user.telegram_id, **values))
+        if version is None:
+            self._forget(user.telegram_id)
+            raise ValueError("User not found")
+        if adopt_columns(user, version, values):
+            self._remember(user)
+        else:
+            self._forget(user.telegram_id)
+
+    # ---------------------------------------------------------------------
+    # Identity map helpers
+    # ---------------------------------------------------------------------
+
+    @staticmethod
+    def _remember(user: User) -> None:
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.put(User, user.telegram_id, user)
+
+    @staticmethod
+    def _forget(telegram_id: int) -> None:
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.discard(User, telegram_id)
@@ -0,0 +1,58 @@
+"""SQLAlchemy implementation of the daily stats rollup repository."""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import List
+
+from sqlalchemy import Insert, Select, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from no_quitting_bot.core.entities.daily_stats import DailyStats
+from no_quitting_bot.core.interfaces.repositories.daily_stats_repo import AbstractDailyStatsRepository
+from no_quitting_bot.dataproviders.db import session_scope
+from no_quitting_bot.dataproviders.repositories._mappers import daily_stats_to_entity
+from no_quitting_bot.dataproviders.repositories._models import DailyUserStatsModel
+
+
+def increment_stmt(dialect_name: str, user_id: int, day: dt.date, smoked: int, early: int, spent: float) -> Insert:
+    """Single-statement upsert adding deltas to a ``(user_id, day)`` row."""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert(DailyUserStatsModel).values(user_id=user_id, day=day, smoked=smoked, early=early, spent=spent)
+    return stmt.on_conflict_do_update(
+        index_elements=[DailyUserStatsModel.user_id, DailyUserStatsModel.day],
+        set_={
+            "smoked": DailyUserStatsModel.smoked + stmt.excluded.smoked,
+            "early": DailyUserStatsModel.early + stmt.excluded.early,
+            "spent": DailyUserStatsModel.spent + stmt.excluded.spent,
+        },
+    )
+
+
+def range_stmt(user_id: int, start: dt.date, end: dt.date) -> Select:
+    return (
+        select(DailyUserStatsModel)
+        .where(
+            DailyUserStatsModel.user_id == user_id,
+            DailyUserStatsModel.day >= start,
+            DailyUserStatsModel.day < end,
+        )
+        .order_by(DailyUserStatsModel.day)
+    )
+
+
+class SqlAlchemyDailyStatsRepository(AbstractDailyStatsRepository):
+    """SQLAlchemy implementation for the ``daily_user_stats`` rollup."""
+
+    def increment(self, user_id: int, day: dt.date, smoked: int, early: int, spent: float) -> None:
+        with session_scope() as session:
+            session.execute(increment_stmt(session.bind.dialect.name, user_id, day, smoked, early, spent))
+
+    def get(self, user_id: int, day: dt.date) -> DailyStats | None:
+        with session_scope() as session:
+            model = session.get(DailyUserStatsModel, (user_id, day), populate_existing=True)
+            return daily_stats_to_entity(model) if model else None
+
+    def list_between(self, user_id: int, start: dt.date, end: dt.date) -> List[DailyStats]:
+        with session_scope() as session:
+            return [daily_stats_to_entity(m) for m in session.scalars(range_stmt(user_id, start, end)).all()]
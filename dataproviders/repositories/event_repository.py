@@ -2,57 +2,93 @@
 
 from __future__ import annotations
 
-from typing import List
+import datetime as dt
+from typing import Iterator, List
 
-from sqlalchemy import select, delete
+from sqlalchemy import Select, delete, func, select, tuple_
 
 from no_quitting_bot.core.entities.smoking_event import SmokingEvent
 from no_quitting_bot.core.interfaces.repositories.event_repo import (
     AbstractSmokingEventRepository,
 )
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
 from no_quitting_bot.dataproviders.db import session_scope
+from no_quitting_bot.dataproviders.repositories._mappers import event_to_entity, event_to_model
 from no_quitting_bot.dataproviders.repositories._models import SmokingEventModel
 
+# ---------------------------------------------------------------------------
+# Statements (shared with the async implementation)
+# ---------------------------------------------------------------------------
+
+
+def events_page_stmt(
+    user_id: int,
+    limit: int | None = None,
+    after_timestamp: dt.datetime | None = None,
+    after_id: int | None = None,
+    newest_first: bool = True,
+) -> Select:
+    """A user's events ordered by ``(timestamp, id)``, starting after the cursor.
+
+    "After" follows the requested order: with ``newest_first`` the page holds
+    events older than ``(after_timestamp, after_id)``. The cursor is a range
+    condition on the ``(user_id, timestamp)`` index (whose entries end in the
+    rowid), so a deep page costs the same as the first one. Without
+    ``after_id`` only the timestamp is compared.
+    """
+    ts, event_id = SmokingEventModel.timestamp, SmokingEventModel.id
+    stmt = select(SmokingEventModel).where(SmokingEventModel.user_id == user_id)
+    if after_timestamp is not None:
+        if after_id is not None:
+            key, cursor = tuple_(ts, event_id), tuple_(after_timestamp, after_id)
+        else:
+            key, cursor = ts, after_timestamp
+        stmt = stmt.where(key < cursor if newest_first else key > cursor)
+    stmt = stmt.order_by(ts.desc(), event_id.desc()) if newest_first else stmt.order_by(ts, event_id)
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _in_range(user_id: int, start: dt.datetime, end: dt.datetime) -> tuple:
+    ts = SmokingEventModel.timestamp
+    return SmokingEventModel.user_id == user_id, ts >= start, ts < end
+
+
+def count_between_stmt(user_id: int, start: dt.datetime, end: dt.datetime) -> Select:
+    """Number of events with ``start <= timestamp < end``; covered by the ``(user_id, timestamp)`` index."""
+    return select(func.count()).select_from(SmokingEventModel).where(*_in_range(user_id, start, end))
+
+
+def list_between_stmt(user_id: int, start: dt.datetime, end: dt.datetime) -> Select:
+    return (
+        select(SmokingEventModel)
+        .where(*_in_range(user_id, start, end))
+        .order_by(SmokingEventModel.timestamp.desc(), SmokingEventModel.id.desc())
+    )
+
 
 class SqlAlchemySmokingEventRepository(AbstractSmokingEventRepository):
     """SQLAlchemy implementation for SmokingEvent repository."""
 
-    def _to_entity(self, model: SmokingEventModel) -> SmokingEvent:
-        return SmokingEvent(
-            id=model.id,
-            user_id=model.user_id,
-            timestamp=model.timestamp,
-            planned_time=model.planned_time,
-            was_early=model.was_early,
-            interval_before=model.interval_before,
-            via_bonus_token=model.via_bonus_token,
-            alternative_done=model.alternative_done,
-        )
-
     def add(self, event: SmokingEvent) -> None:
         with session_scope() as session:
-            model = SmokingEventModel(
-                user_id=event.user_id,
-                timestamp=event.timestamp,
-                planned_time=event.planned_time,
-                was_early=event.was_early,
-                interval_before=event.interval_before,
-                via_bonus_token=event.via_bonus_token,
-                alternative_done=event.alternative_done,
-            )
+            model = event_to_model(event)
             session.add(model)
             session.flush()
             event.id = model.id
 
-    def list_by_user(self, user_id: int, limit: int | None = None) -> List[SmokingEvent]:
+    def list_by_user(
+        self,
+        user_id: int,
+        limit: int | None = None,
+        after_timestamp: dt.datetime | None = None,
+        after_id: int | None = None,
+        newest_first: bool = True,
+    ) -> List[SmokingEvent]:
         with session_scope() as session:
-            stmt = select(SmokingEventModel).where(SmokingEventModel.user_id == user_id).order_by(
-                SmokingEventModel.timestamp.desc()
-            )
-            if limit:
-                stmt = stmt.limit(limit)
-            models = session.scalars(stmt).all()
-            return [self._to_entity(m) for m in models]
+            stmt = events_page_stmt(user_id, limit, after_timestamp, after_id, newest_first)
+            return [event_to_entity(m) for m in session.scalars(stmt)]
 
     def delete(self, event_id: int) -> None:
         with session_scope() as session:
@@ -64,5 +100,23 @@ class SqlAlchemySmokingEventRepository(AbstractSmokingEventRepository):
                 select(SmokingEventModel)
                 .where(SmokingEventModel.user_id == user_id)
                 .order_by(SmokingEventModel.timestamp.desc())
+                .limit(1)
             )
-            return self._to_entity(model) if model else None 
\ No newline at end of file
+            return event_to_entity(model) if model else None
+
+    def count_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> int:
+        with session_scope() as session:
+            return session.scalar(count_between_stmt(user_id, start, end)) or 0
+
+    def list_between(self, user_id: int, start: dt.datetime, end: dt.datetime) -> List[SmokingEvent]:
+        with session_scope() as session:
+            return [event_to_entity(m) for m in session.scalars(list_between_stmt(user_id, start, end)).all()]
+
+    def iter_by_user(self, user_id: int, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[SmokingEvent]]:
+        events = self.list_by_user(user_id, batch_size, newest_first=False)
+        while events:
+            yield events
+            if len(events) < batch_size:
+                return
+            last = events[-1]
+            events = self.list_by_user(user_id, batch_size, last.timestamp, last.id, newest_first=False)
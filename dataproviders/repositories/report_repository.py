@@ -0,0 +1,75 @@
+"""SQLAlchemy implementation of the reporting repository."""
+
+from __future__ import annotations
+
+import datetime as dt
+from typing import Iterator, List, Sequence
+
+from sqlalchemy import Row, Select, func, select
+
+from no_quitting_bot.core.entities.report import UserPeriodCount
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+from no_quitting_bot.core.interfaces.repositories.report_repo import AbstractReportRepository
+from no_quitting_bot.dataproviders.db import session_scope
+from no_quitting_bot.dataproviders.repositories._models import DailyUserStatsModel, UserModel
+from no_quitting_bot.dataproviders.repositories.user_repository import users_page_stmt
+
+# ---------------------------------------------------------------------------
+# Statements (shared with the async implementation)
+# ---------------------------------------------------------------------------
+
+# the only user columns a report needs; pages select these instead of whole rows
+REPORT_USER_COLUMNS = (UserModel.telegram_id, UserModel.cigarettes_per_day, UserModel.cigarette_cost)
+
+
+def period_counts_stmt(first_id: int, last_id: int, start: dt.date, end: dt.date) -> Select:
+    """Per-user totals for one page: a GROUP BY over the daily rollup's (user_id, day) key range."""
+    return (
+        select(
+            DailyUserStatsModel.user_id,
+            func.sum(DailyUserStatsModel.smoked),
+            func.sum(DailyUserStatsModel.spent),
+        )
+        .where(
+            DailyUserStatsModel.user_id >= first_id,
+            DailyUserStatsModel.user_id <= last_id,
+            DailyUserStatsModel.day >= start,
+            DailyUserStatsModel.day < end,
+        )
+        .group_by(DailyUserStatsModel.user_id)
+    )
+
+
+def merge_counts(users: Sequence[Row], counts: Sequence[Row]) -> List[UserPeriodCount]:
+    by_user = {user_id: (smoked, spent) for user_id, smoked, spent in counts}
+    result = []
+    for u in users:
+        smoked, spent = by_user.get(u.telegram_id, (0, 0.0))
+        result.append(
+            UserPeriodCount(
+                telegram_id=u.telegram_id,
+                cigarettes_per_day=u.cigarettes_per_day,
+                cigarette_cost=u.cigarette_cost,
+                smoked=smoked,
+                spent=spent,
+            )
+        )
+    return result
+
+
+class SqlAlchemyReportRepository(AbstractReportRepository):
+    """Keyset-paginated reporting queries; memory is bounded by ``batch_size``."""
+
+    def iter_period_counts(
+        self, start: dt.date, end: dt.date, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[List[UserPeriodCount]]:
+        after: int | None = None
+        while True:
+            with session_scope() as session:
+                users = session.execute(users_page_stmt(after, batch_size, columns=REPORT_USER_COLUMNS)).all()
+                if not users:
+                    return
+                first, last = users[0].telegram_id, users[-1].telegram_id
+                counts = session.execute(period_counts_stmt(first, last, start, end)).all()
+            yield merge_counts(users, counts)
+            after = last
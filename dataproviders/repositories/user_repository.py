@@ -3,52 +3,30 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import List
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, Select, Update, bindparam, case, select, tuple_, update
 
 from no_quitting_bot.core.entities.user import User
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
+from no_quitting_bot.core.interfaces.repositories import DEFAULT_BATCH_SIZE
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractUserRepository,
+    ConcurrentUpdateError,
+)
 from no_quitting_bot.dataproviders.db import session_scope
+from no_quitting_bot.dataproviders.repositories._mappers import (
+    USER_GROWTH_COLUMNS,
+    USER_STATE_COLUMNS,
+    user_to_entity,
+    user_to_model,
+    user_to_values,
+)
 from no_quitting_bot.dataproviders.repositories._models import UserModel
 
 
 class SqlAlchemyUserRepository(AbstractUserRepository):
     """SQLAlchemy-based user repository implementation."""
 
-    def _to_entity(self, model: UserModel) -> User:
-        return User(
-            telegram_id=model.telegram_id,
-            cigarettes_per_day=model.cigarettes_per_day,
-            cigarette_cost=model.cigarette_cost,
-            interval_minutes=model.interval_minutes,
-            last_interval_update=model.last_interval_update,
-            next_allowed_time=model.next_allowed_time,
-            early_counter=model.early_counter,
-            spent=model.spent,
-            savings=model.savings,
-            hub_message_id=model.hub_message_id,
-            last_delay_offer=model.last_delay_offer,
-            growth_pause_until=model.growth_pause_until.date() if model.growth_pause_until else None,
-            target_cigs_per_day=model.target_cigs_per_day,
-            days_success_streak=model.days_success_streak,
-        )
-
-    def _update_model(self, model: UserModel, entity: User) -> None:
-        model.cigarettes_per_day = entity.cigarettes_per_day
-        model.cigarette_cost = entity.cigarette_cost
-        model.interval_minutes = entity.interval_minutes
-        model.last_interval_update = entity.last_interval_update
-        model.next_allowed_time = entity.next_allowed_time
-        model.early_counter = entity.early_counter
-        model.spent = entity.spent
-        model.savings = entity.savings
-        model.hub_message_id = entity.hub_message_id
-        model.last_delay_offer = entity.last_delay_offer
-        model.growth_pause_until = dt.datetime.combine(entity.growth_pause_until, dt.time()) if entity.growth_pause_until else None
-        model.target_cigs_per_day = entity.target_cigs_per_day
-        model.days_success_streak = entity.days_success_streak
-
     # ---------------------------------------------------------------------
     # Public methods
     # ---------------------------------------------------------------------
@@ -59,40 +37,299 @@ class SqlAlchemyUserRepository(AbstractUserRepository):
                 select(UserModel).where(UserModel.telegram_id == telegram_id)
             )
             if model:
-                return self._to_entity(model)
+                return user_to_entity(model)
             return None
 
     def add(self, user: User) -> None:
         with session_scope() as session:
-            model = UserModel(
-                telegram_id=user.telegram_id,
-                cigarettes_per_day=user.cigarettes_per_day,
-                cigarette_cost=user.cigarette_cost,
-                interval_minutes=user.interval_minutes,
-                last_interval_update=user.last_interval_update,
-                next_allowed_time=user.next_allowed_time,
-                early_counter=user.early_counter,
-                spent=user.spent,
-                savings=user.savings,
-                hub_message_id=user.hub_message_id,
-                last_delay_offer=user.last_delay_offer,
-                growth_pause_until=dt.datetime.combine(user.growth_pause_until, dt.time()) if user.growth_pause_until else None,
-                target_cigs_per_day=user.target_cigs_per_day,
-                days_success_streak=user.days_success_streak,
-            )
-            session.add(model)
+            session.add(user_to_model(user))
 
     def update(self, user: User) -> None:
+        if not self.update_if_version(user):
+            raise ConcurrentUpdateError(user.telegram_id)
+
+    def update_if_version(self, user: User, spent_delta: float = 0.0) -> bool:
         with session_scope() as session:
-            model: UserModel | None = session.scalar(
-                select(UserModel).where(UserModel.telegram_id == user.telegram_id)
-            )
-            if not model:
-                raise ValueError("User not found")
-            self._update_model(model, user)
-            session.add(model)
+            row = session.execute(update_if_version_stmt(user, spent_delta)).one_or_none()
+        if row is None:
+            return False
+        user.spent, user.version = row
+        return True
+
+    def increment_spent(self, telegram_id: int, amount: float) -> float:
+        with session_scope() as session:
+            spent = session.scalar(increment_spent_stmt(telegram_id, amount))
+        if spent is None:
+            raise ValueError("User not found")
+        return spent
+
+    def set_next_allowed_if_version(self, user: User, next_allowed_time: dt.datetime) -> bool:
+        with session_scope() as session:
+            version = session.scalar(set_next_allowed_if_version_stmt(user, next_allowed_time))
+        if version is None:
+            return False
+        user.next_allowed_time, user.version = next_allowed_time, version
+        return True
+
+    def iter_all(self, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[User]]:
+        return self._iter_pages(batch_size)
+
+    def list_by_telegram_ids(self, telegram_ids: Iterable[int]) -> List[User]:
+        with session_scope() as session:
+            return [
+                user_to_entity(m)
+                for stmt in by_telegram_ids_stmts(telegram_ids)
+                for m in session.scalars(stmt)
+            ]
+
+    def iter_inactive(self, before: dt.datetime, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[User]]:
+        cursor: InactiveCursor | None = INACTIVE_START
+        while cursor is not None:
+            with session_scope() as session:
+                models = session.scalars(inactive_page_stmt(before, batch_size, cursor)).all()
+                users = [user_to_entity(m) for m in models]
+                cursor = next_inactive_cursor(cursor, models, batch_size)
+            if users:
+                yield users
+
+    def bulk_update_growth(self, users: Iterable[User]) -> List[int]:
+        users = list(users)
+        if not users:
+            return []
+        stmt = bulk_update_growth_stmt()
+        with session_scope() as session:
+            # one statement per row so each skipped row is known; still one transaction
+            stale = [
+                params["b_telegram_id"]
+                for params in bulk_update_growth_params(users)
+                if session.execute(stmt, params).rowcount == 0
+            ]
+        bump_versions(users, stale)
+        return stale
+
+    def set_hub_message_id(self, user: User, message_id: int) -> None:
+        self._set_columns(user, hub_message_id=message_id)
+
+    def set_last_delay_offer(self, user: User, offered_at: dt.datetime) -> None:
+        self._set_columns(user, last_delay_offer=offered_at)
+
+    def bump_version(self, user: User) -> None:
+        self._set_columns(user)
 
-    def list_all(self) -> List[User]:
+    def mark_seen(self, telegram_id: int, seen_at: dt.datetime) -> bool:
         with session_scope() as session:
-            models = session.scalars(select(UserModel)).all()
-            return [self._to_entity(m) for m in models] 
\ No newline at end of file
+            return session.execute(mark_seen_stmt(telegram_id, seen_at)).rowcount > 0
+
+    def list_seen_since(self, since: dt.datetime) -> List[User]:
+        with session_scope() as session:
+            return [user_to_entity(m) for m in session.scalars(seen_since_stmt(since))]
+
+    def list_next_allowed_between(self, after: dt.datetime, until: dt.datetime) -> List[Tuple[int, dt.datetime]]:
+        with session_scope() as session:
+            return [tuple(row) for row in session.execute(next_allowed_between_stmt(after, until))]
+
+    # ---------------------------------------------------------------------
+    # Internal helpers
+    # ---------------------------------------------------------------------
+
+    @staticmethod
+    def _set_columns(user: User, **values: Any) -> None:
+        with session_scope() as session:
+            version = session.scalar(set_columns_stmt(user.telegram_id, **values))
+        if version is None:
+            raise ValueError("User not found")
+        adopt_columns(user, version, values)
+
+    @staticmethod
+    def _iter_pages(batch_size: int, *criteria: ColumnElement[bool]) -> Iterator[List[User]]:
+        # one short session per page: nothing stays open while the caller works on a chunk
+        after: int | None = None
+        while True:
+            with session_scope() as session:
+                users = [user_to_entity(m) for m in session.scalars(users_page_stmt(after, batch_size, *criteria))]
+            if users:
+                yield users
+            if len(users) < batch_size:
+                return
+            after = users[-1].telegram_id
+
+
+# ---------------------------------------------------------------------------
+# Statements (shared with the async repository)
+# ---------------------------------------------------------------------------
+# Every write bumps ``version``, so a compare-and-swap made from an older
+# snapshot of the row fails instead of overwriting newer data.
+
+
+def _spent_plus(delta: float) -> ColumnElement[float]:
+    """``spent + delta`` evaluated in SQL, never below zero."""
+    new_spent = UserModel.__table__.c.spent + delta
+    return case((new_spent < 0, 0.0), else_=new_spent)
+
+
+def set_columns_stmt(telegram_id: int, **values: Any) -> Update:
+    """Write only ``values``; the version is still bumped so compare-and-swap writers reload.
+
+    Returns the new version.
+    """
+    table = UserModel.__table__
+    return (
+        update(table)
+        .where(table.c.telegram_id == telegram_id)
+        .values(**values, version=table.c.version + 1)
+        .returning(table.c.version)
+    )
+
+
+def adopt_columns(user: User, version: int, values: dict[str, Any]) -> bool:
+    """Apply a :func:`set_columns_stmt` write to ``user``.
+
+    The new version is taken only if ours was the sole write since ``user``
+    was loaded; otherwise the entity keeps its old version, so its next
+    compare-and-swap fails and reloads instead of overwriting the other write.
+    Returns whether the entity is still current.
+    """
+    for name, value in values.items():
+        setattr(user, name, value)
+    if version != user.version + 1:
+        return False
+    user.version = version
+    return True
+
+
+def update_if_version_stmt(user: User, spent_delta: float) -> Update:
+    """Write ``user`` only if the row still has ``user.version``; returns ``(spent, version)``."""
+    table = UserModel.__table__
+    values = {k: v for k, v in user_to_values(user).items() if k in USER_STATE_COLUMNS}
+    return (
+        update(table)
+        .where(table.c.telegram_id == user.telegram_id, table.c.version == user.version)
+        .values(**values, spent=_spent_plus(spent_delta), version=table.c.version + 1)
+        .returning(table.c.spent, table.c.version)
+    )
+
+
+def increment_spent_stmt(telegram_id: int, amount: float) -> Update:
+    table = UserModel.__table__
+    return (
+        update(table)
+        .where(table.c.telegram_id == telegram_id)
+        .values(spent=_spent_plus(amount), version=table.c.version + 1)
+        .returning(table.c.spent)
+    )
+
+
+def set_next_allowed_if_version_stmt(user: User, next_allowed_time: dt.datetime) -> Update:
+    table = UserModel.__table__
+    return (
+        update(table)
+        .where(table.c.telegram_id == user.telegram_id, table.c.version == user.version)
+        .values(next_allowed_time=next_allowed_time, version=table.c.version + 1)
+        .returning(table.c.version)
+    )
+
+
+def mark_seen_stmt(telegram_id: int, seen_at: dt.datetime) -> Update:
+    """The one write that keeps ``version``: ``last_seen_at`` is not part of the entity."""
+    table = UserModel.__table__
+    return update(table).where(table.c.telegram_id == telegram_id).values(last_seen_at=seen_at)
+
+
+def seen_since_stmt(since: dt.datetime) -> Select:
+    return select(UserModel).where(UserModel.last_seen_at >= since)
+
+
+def bulk_update_growth_stmt() -> Update:
+    """Conditional UPDATE of the growth columns; executed once per :func:`bulk_update_growth_params` row."""
+    table = UserModel.__table__
+    return (
+        update(table)
+        .where(table.c.telegram_id == bindparam("b_telegram_id"), table.c.version == bindparam("b_version"))
+        .values({**{name: bindparam(f"b_{name}") for name in USER_GROWTH_COLUMNS}, "version": table.c.version + 1})
+    )
+
+
+def bulk_update_growth_params(users: Iterable[User]) -> list[dict[str, Any]]:
+    # bind names must not clash with column names in an UPDATE's SET clause
+    params = []
+    for u in users:
+        values = user_to_values(u)
+        row = {f"b_{name}": values[name] for name in USER_GROWTH_COLUMNS}
+        row.update(b_telegram_id=u.telegram_id, b_version=u.version)
+        params.append(row)
+    return params
+
+
+def bump_versions(users: Iterable[User], stale: List[int]) -> None:
+    skipped = set(stale)
+    for u in users:
+        if u.telegram_id not in skipped:
+            u.version += 1
+
+
+IN_BATCH_SIZE = 500  # stay well below SQLite's bound-parameter limit
+
+
+def by_telegram_ids_stmts(telegram_ids: Iterable[int]) -> Iterator[Select]:
+    ids = list(telegram_ids)
+    for i in range(0, len(ids), IN_BATCH_SIZE):
+        yield select(UserModel).where(UserModel.telegram_id.in_(ids[i : i + IN_BATCH_SIZE]))
+
+
+def next_allowed_between_stmt(after: dt.datetime, until: dt.datetime) -> Select:
+    """Range scan on ``ix_users_next_allowed_time``: only the rows inside the window are read."""
+    nat = UserModel.next_allowed_time
+    return select(UserModel.telegram_id, nat).where(nat > after, nat <= until)
+
+
+def users_page_stmt(
+    after_telegram_id: int | None,
+    batch_size: int,
+    *criteria: ColumnElement[bool],
+    columns: Sequence[Any] = (UserModel,),
+) -> Select:
+    """Next keyset page of users matching ``criteria``, ordered by telegram id.
+
+    Each page is an index range scan starting after the previous page's last
+    id, so the cost per page does not grow with the offset. ``columns``
+    narrows the select for callers that do not need whole rows.
+    """
+    stmt = select(*columns).where(*criteria)
+    if after_telegram_id is not None:
+        stmt = stmt.where(UserModel.telegram_id > after_telegram_id)
+    return stmt.order_by(UserModel.telegram_id).limit(batch_size)
+
+
+# (still among the users without events, last_event_at, id) of the previous page's last row
+InactiveCursor = Tuple[bool, dt.datetime | None, int | None]
+INACTIVE_START: InactiveCursor = (True, None, None)
+
+
+def inactive_page_stmt(before: dt.datetime, batch_size: int, cursor: InactiveCursor) -> Select:
+    """Next keyset page of users with no events or none since ``before``.
+
+    Users without events come first, then the rest by ``last_event_at``; ties
+    are broken by row id. Both parts are range scans on
+    ``ix_users_last_event_at`` (whose entries end in the rowid) that start
+    after the cursor, so the job reads only the matching rows and a deep page
+    costs the same as the first one.
+    """
+    never_active, after_last_event_at, after_id = cursor
+    last, row_id = UserModel.last_event_at, UserModel.id
+    if never_active:
+        stmt = select(UserModel).where(last.is_(None))
+        if after_id is not None:
+            stmt = stmt.where(row_id > after_id)
+        return stmt.order_by(row_id).limit(batch_size)
+    stmt = select(UserModel).where(last < before)
+    if after_id is not None:
+        stmt = stmt.where(tuple_(last, row_id) > tuple_(after_last_event_at, after_id))
+    return stmt.order_by(last, row_id).limit(batch_size)
+
+
+def next_inactive_cursor(cursor: InactiveCursor, page: Sequence[UserModel], batch_size: int) -> InactiveCursor | None:
+    """Cursor for the page after ``page``, or None when the iteration is done."""
+    never_active = cursor[0]
+    if len(page) == batch_size:
+        return never_active, page[-1].last_event_at, page[-1].id
+    return (False, None, None) if never_active else None
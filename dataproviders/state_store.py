@@ -0,0 +1,264 @@
+"""Bounded key/value stores with per-key TTL for short-lived bot state.
+
+``TTLStore`` is a dict-like in-memory store: entries expire after their TTL
+(checked lazily on access and by periodic :meth:`TTLStore.sweep` calls) and
+the least recently used entry is evicted once ``max_size`` is reached.
+
+``PersistentTTLStore`` adds write-behind persistence to the project database:
+reads and writes stay in memory, changed keys are written out by
+:meth:`PersistentTTLStore.flush` and the store is reloaded on startup.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Iterable, Iterator, TypeVar
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from no_quitting_bot.dataproviders.db import async_session_scope
+from no_quitting_bot.dataproviders.repositories._models import StateEntryModel
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+# "memory" (default) or "sqlite" (persist to the project database)
+STATE_BACKEND = os.getenv("QS_STATE_BACKEND", "memory")
+SWEEP_INTERVAL_SECONDS = 60
+
+
+class TTLStore(Generic[K, V]):
+    """In-memory mapping with per-key TTL and LRU eviction."""
+
+    def __init__(self, default_ttl: float | None = None, max_size: int = 100_000) -> None:
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.evictions = 0
+        self.expirations = 0
+        self._data: OrderedDict[K, tuple[V, float | None]] = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # dict-like API
+    # ------------------------------------------------------------------
+
+    def get(self, key: K, default: Any = None) -> V | Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._expire(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self._data[key] = (value, time.time() + ttl if ttl is not None else None)
+        self._data.move_to_end(key)
+        self._touched(key)
+        while len(self._data) > self.max_size:
+            evicted, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            self._touched(evicted)
+
+    def pop(self, key: K, default: Any = None) -> V | Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        del self._data[key]
+        self._touched(key)
+        return value
+
+    def __getitem__(self, key: K) -> V:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: K) -> None:
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key, _MISSING) is not _MISSING  # type: ignore[arg-type]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def keys(self) -> Iterator[K]:
+        now = time.time()
+        return iter([k for k, (_, exp) in self._data.items() if exp is None or exp > now])
+
+    # ------------------------------------------------------------------
+    # Expiry
+    # ------------------------------------------------------------------
+
+    def sweep(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        now = time.time()
+        expired = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+        for key in expired:
+            self._expire(key)
+        return len(expired)
+
+    def _expire(self, key: K) -> None:
+        del self._data[key]
+        self.expirations += 1
+        self._touched(key)
+
+    def _touched(self, key: K) -> None:
+        """Hook for subclasses tracking changed keys."""
+
+    async def load(self) -> None:
+        """Restore persisted entries (no-op for the in-memory backend)."""
+
+    async def flush(self) -> None:
+        """Persist pending changes (no-op for the in-memory backend)."""
+
+
+# ---------------------------------------------------------------------------
+# Persistent backend
+# ---------------------------------------------------------------------------
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, dt.datetime):
+        return {"__dt__": value.isoformat()}
+    raise TypeError(f"Cannot persist {type(value).__name__} in a state store")
+
+
+def _decode(obj: dict[str, Any]) -> Any:
+    if "__dt__" in obj and len(obj) == 1:
+        return dt.datetime.fromisoformat(obj["__dt__"])
+    return obj
+
+
+class PersistentTTLStore(TTLStore[K, V]):
+    """``TTLStore`` mirrored into the ``state_entries`` table (write-behind).
+
+    Keys are stored as JSON so int user ids round-trip; values must be JSON
+    serialisable (datetimes are supported).
+    """
+
+    def __init__(self, namespace: str, default_ttl: float | None = None, max_size: int = 100_000) -> None:
+        super().__init__(default_ttl=default_ttl, max_size=max_size)
+        self.namespace = namespace
+        self._dirty: set[K] = set()
+
+    def _touched(self, key: K) -> None:
+        self._dirty.add(key)
+
+    async def load(self) -> None:
+        now = time.time()
+        async with async_session_scope() as session:
+            rows = (
+                await session.scalars(
+                    select(StateEntryModel)
+                    .where(StateEntryModel.namespace == self.namespace)
+                    .order_by(StateEntryModel.updated_at)
+                )
+            ).all()
+        for row in rows:
+            if row.expires_at is not None and row.expires_at <= now:
+                continue
+            key = json.loads(row.key)
+            self._data[key] = (json.loads(row.value, object_hook=_decode), row.expires_at)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        self._dirty.clear()
+
+        async with async_session_scope() as session:
+            await session.execute(
+                delete(StateEntryModel).where(
+                    StateEntryModel.namespace == self.namespace,
+                    StateEntryModel.expires_at <= now,
+                )
+            )
+        logger.info("State store %s: %d entries restored", self.namespace, len(self._data))
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts: list[dict[str, Any]] = []
+        removed: list[str] = []
+        now = time.time()
+        for key in dirty:
+            entry = self._data.get(key)
+            if entry is None:
+                removed.append(json.dumps(key))
+            else:
+                value, expires_at = entry
+                upserts.append(
+                    {
+                        "namespace": self.namespace,
+                        "key": json.dumps(key),
+                        "value": json.dumps(value, default=_encode),
+                        "expires_at": expires_at,
+                        "updated_at": now,
+                    }
+                )
+        try:
+            async with async_session_scope() as session:
+                if removed:
+                    await session.execute(
+                        delete(StateEntryModel).where(
+                            StateEntryModel.namespace == self.namespace,
+                            StateEntryModel.key.in_(removed),
+                        )
+                    )
+                if upserts:
+                    insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+                    stmt = insert(StateEntryModel)
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[StateEntryModel.namespace, StateEntryModel.key],
+                            set_={
+                                "value": stmt.excluded.value,
+                                "expires_at": stmt.excluded.expires_at,
+                                "updated_at": stmt.excluded.updated_at,
+                            },
+                        ),
+                        upserts,
+                    )
+        except Exception:
+            # keep the changes for the next attempt
+            self._dirty |= dirty
+            raise
+
+
+def make_state_store(namespace: str, default_ttl: float | None = None, max_size: int = 100_000) -> TTLStore:
+    """Create a store using the backend selected by ``QS_STATE_BACKEND``."""
+    if STATE_BACKEND == "sqlite":
+        return PersistentTTLStore(namespace, default_ttl=default_ttl, max_size=max_size)
+    if STATE_BACKEND != "memory":
+        raise RuntimeError(f"Unknown QS_STATE_BACKEND {STATE_BACKEND!r}; expected 'memory' or 'sqlite'")
+    return TTLStore(default_ttl=default_ttl, max_size=max_size)
+
+
+async def run_maintenance(stores: Iterable[TTLStore], interval: float = SWEEP_INTERVAL_SECONDS) -> None:
+    """Periodically expire entries and flush persistent stores (runs until cancelled)."""
+    stores = list(stores)
+    while True:
+        await asyncio.sleep(interval)
+        for store in stores:
+            try:
+                store.sweep()
+                await store.flush()
+            except Exception as e:
+                logger.warning("State store maintenance failed: %s", e)
@@ -13,14 +13,17 @@ import os
 from datetime import timedelta
 import datetime as dt
 import random
+import time
+from typing import TYPE_CHECKING
 
-from aiogram import Bot, Dispatcher, F
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.filters import Command, CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import (
     CallbackQuery,
     InlineKeyboardButton,
@@ -28,25 +31,53 @@ from aiogram.types import (
     Message,
 )
 
-from no_quitting_bot.core.interfaces.repositories.user_repo import AbstractUserRepository
-from no_quitting_bot.core.interfaces.repositories.event_repo import AbstractSmokingEventRepository
-from no_quitting_bot.dataproviders.repositories.user_repository import (
-    SqlAlchemyUserRepository,
+from no_quitting_bot.core.interfaces.repositories.user_repo import (
+    AbstractAsyncUserRepository,
+    ConcurrentUpdateError,
 )
-from no_quitting_bot.dataproviders.repositories.event_repository import (
-    SqlAlchemySmokingEventRepository,
+from no_quitting_bot.core.interfaces.repositories.event_repo import AbstractAsyncSmokingEventRepository
+from no_quitting_bot.core.interfaces.repositories.report_repo import AbstractAsyncReportRepository
+from no_quitting_bot.core.interfaces.repositories.daily_stats_repo import AbstractAsyncDailyStatsRepository
+from no_quitting_bot.dataproviders.repositories.async_user_repository import (
+    AsyncSqlAlchemyUserRepository,
 )
-from no_quitting_bot.dataproviders.db import engine, Base
+from no_quitting_bot.dataproviders.repositories.async_event_repository import (
+    AsyncSqlAlchemySmokingEventRepository,
+)
+from no_quitting_bot.dataproviders.repositories.async_report_repository import (
+    AsyncSqlAlchemyReportRepository,
+)
+from no_quitting_bot.dataproviders.repositories.async_daily_stats_repository import (
+    AsyncSqlAlchemyDailyStatsRepository,
+)
+from no_quitting_bot.dataproviders.db import AsyncUnitOfWork, run_migrations
 from no_quitting_bot.core.usecases import (
     init_user as init_user_uc,
     can_smoke_now as can_smoke_now_uc,
     register_smoking_event as register_smoke_uc,
+    history_page as history_uc,
 )
 
 from no_quitting_bot.core.entities.user import User
-from no_quitting_bot.utils import hub
+from no_quitting_bot.dataproviders.state_store import TTLStore, make_state_store, run_maintenance
+from no_quitting_bot.dataproviders.fsm_storage import SqlAlchemyStorage
+from no_quitting_bot.dataproviders.leader_lease import LeaderLease
+from no_quitting_bot.dataproviders import query_profiler
+from no_quitting_bot.dataproviders.query_profiler import profiled
+from no_quitting_bot.entrypoints.middlewares import (
+    ApiMetricsMiddleware,
+    CommitBeforeRequestMiddleware,
+    HandlerMetricsMiddleware,
+    QueryProfilerMiddleware,
+    UnitOfWorkMiddleware,
+)
+from no_quitting_bot.utils import export, history, hub, metrics
+from no_quitting_bot.utils.broadcast import BroadcastDispatcher, TokenBucket
+from no_quitting_bot.utils.timers import TimerService
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+if TYPE_CHECKING:  # APScheduler is imported when the scheduler is first needed
+    from apscheduler.events import JobEvent
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # ---------------------------------------------------------------------------
 # Configure logging & DB
@@ -54,112 +85,135 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Create DB tables
-Base.metadata.create_all(bind=engine)
-
-# Run simple migrations for new columns
-from no_quitting_bot.dataproviders.db import run_migrations
+# The schema is created/upgraded by run_migrations() in the startup hooks
+# (_runner / webhook on_startup), not on import
 
-run_migrations()
+# Repositories (async, so DB I/O never blocks the event loop)
+user_repo: AbstractAsyncUserRepository = AsyncSqlAlchemyUserRepository()
+event_repo: AbstractAsyncSmokingEventRepository = AsyncSqlAlchemySmokingEventRepository()
+report_repo: AbstractAsyncReportRepository = AsyncSqlAlchemyReportRepository()
+stats_repo: AbstractAsyncDailyStatsRepository = AsyncSqlAlchemyDailyStatsRepository()
 
-# Repositories
-user_repo: AbstractUserRepository = SqlAlchemyUserRepository()
-event_repo: AbstractSmokingEventRepository = SqlAlchemySmokingEventRepository()
+# Scheduler setup: every process runs one (see get_scheduler), but jobs only fire in the lease holder
+scheduler: AsyncIOScheduler | None = None
+scheduler_lease = LeaderLease("scheduler")
 
-# Scheduler setup
-scheduler = AsyncIOScheduler(timezone="UTC")
+# Last rendered hub per user, to skip no-op edits
+hub_render_cache = hub.HubRenderCache()
 
 # ---------------------------------------------------------------------------
-# Alternative task system (in-memory)
+# Alternative task system (bounded TTL store)
 # ---------------------------------------------------------------------------
 ALTERNATIVE_TASKS: list[str] = [
     "10 отжиманий",
     "2 мин дыхания по схеме 4-7-8",
 ]
+ALTERNATIVE_MINUTES = 2
 
 # user_id → {"expires_at": datetime, "task": str}
-PENDING_ALTERNATIVES: dict[int, dict[str, dt.datetime | str]] = {}
+PENDING_ALTERNATIVES: TTLStore[int, dict[str, dt.datetime | str]] = make_state_store(
+    "pending_alternatives", default_ttl=ALTERNATIVE_MINUTES * 60 + 60
+)
+
+
+async def _set_alternative(user: User, task: str) -> None:
+    PENDING_ALTERNATIVES[user.telegram_id] = {
+        "expires_at": dt.datetime.utcnow() + dt.timedelta(minutes=ALTERNATIVE_MINUTES),
+        "task": task,
+    }
+    # the hub text changes but the row does not: bump the version the hub render cache keys on
+    await user_repo.bump_version(user)
+
+
+async def _clear_alternative(user: User) -> None:
+    if PENDING_ALTERNATIVES.pop(user.telegram_id, None) is not None:
+        await user_repo.bump_version(user)
 
-# Inactivity ping tracking (in-memory)
-LAST_PING: dict[int, dt.datetime] = {}
+
+# Inactivity ping tracking
 INACTIVITY_HOURS = 12  # n часов молчания
+LAST_PING: TTLStore[int, dt.datetime] = make_state_store("last_ping", default_ttl=INACTIVITY_HOURS * 3600)
+
+# Shown when a write lost the compare-and-swap race too many times
+RETRY_TEXT = "Не получилось сохранить, попробуй ещё раз"
 
 # ---------------------------------------------------------------------------
 # Weekly report job
 # ---------------------------------------------------------------------------
 
 
+@profiled("job weekly_reports")
 async def send_weekly_reports() -> None:
-    now = dt.datetime.utcnow()
-    week_start = now - dt.timedelta(days=7)
-    users = user_repo.list_all()
-    for user in users:
-        events = event_repo.list_by_user(user.telegram_id)
-        events_last_week = [e for e in events if e.timestamp >= week_start]
-        smoked = len(events_last_week)
-        planned = user.cigarettes_per_day * 7
-        not_smoked = max(planned - smoked, 0)
-        cost_per_cig = user.cigarette_cost
-        spent = smoked * cost_per_cig
-        saved = not_smoked * cost_per_cig
-
-        report_text = (
-            "📅 Итоги недели:\n"
-            f"Выкурено: {smoked} шт (−{not_smoked} от плана)\n"
-            f"Потрачено: {spent:.2f} zł\n"
-            f"Сэкономлено: {saved:.2f} zł"
-        )
-
-        try:
-            await bot.send_message(chat_id=user.telegram_id, text=report_text)
-        except Exception as e:
-            logger.warning("Failed to send weekly report to %s: %s", user.telegram_id, e)
+    # Previous 7 full UTC days, read from the daily rollup
+    today = dt.datetime.utcnow().date()
+    week_start = today - dt.timedelta(days=7)
+    # One keyset-paginated GROUP BY per chunk of users instead of a full history scan per user
+    async with BroadcastDispatcher(bot) as broadcast:
+        async for chunk in report_repo.iter_period_counts(week_start, today):
+            for row in chunk:
+                smoked = row.smoked
+                planned = row.cigarettes_per_day * 7
+                not_smoked = max(planned - smoked, 0)
+                cost_per_cig = row.cigarette_cost
+                spent = row.spent
+                saved = not_smoked * cost_per_cig
+
+                report_text = (
+                    "📅 Итоги недели:\n"
+                    f"Выкурено: {smoked} шт (−{not_smoked} от плана)\n"
+                    f"Потрачено: {spent:.2f} zł\n"
+                    f"Сэкономлено: {saved:.2f} zł"
+                )
+                await broadcast.submit(row.telegram_id, report_text)
+    logger.info("Weekly reports: %s", broadcast.stats)
 
 
 # ---------------------------------------------------------------------------
 # Inactivity ping job
 # ---------------------------------------------------------------------------
 
+@profiled("job inactivity_pings")
 async def send_inactivity_pings() -> None:
     now = dt.datetime.utcnow()
     threshold = dt.timedelta(hours=INACTIVITY_HOURS)
-    users = user_repo.list_all()
-    for user in users:
-        last_event = event_repo.get_last(user.telegram_id)
-        if last_event:
-            inactivity = now - last_event.timestamp
-        else:
-            inactivity = threshold + dt.timedelta(seconds=1)  # ensure ping if never smoked
-
-        if inactivity < threshold:
-            continue  # active recently
 
-        # avoid duplicate pings within same threshold
-        last_ping = LAST_PING.get(user.telegram_id)
-        if last_ping and (now - last_ping) < threshold:
-            continue
-
-        avoided_cigs = int(inactivity.total_seconds() / 60 / max(user.interval_minutes, 1))
-        saved = avoided_cigs * user.cigarette_cost
-
-        text = (
-            "👋 Маленький чек-ин!\n"
-            f"Ты не заходил {INACTIVITY_HOURS}+ часов и уже сэкономил примерно {saved:.2f} zł. Продолжай в том же духе!"
-        )
-        try:
-            await bot.send_message(chat_id=user.telegram_id, text=text)
-            LAST_PING[user.telegram_id] = now
-        except Exception as e:
-            logger.warning("Failed to send inactivity ping to %s: %s", user.telegram_id, e)
+    def _mark_pinged(chat_id: int) -> None:
+        LAST_PING[chat_id] = now
+
+    async with BroadcastDispatcher(bot) as broadcast:
+        # Indexed filter on users.last_event_at, read in keyset pages while sending
+        async for users in user_repo.iter_inactive(now - threshold):
+            for user in users:
+                if user.last_event_at:
+                    inactivity = now - user.last_event_at
+                else:
+                    inactivity = threshold + dt.timedelta(seconds=1)  # ensure ping if never smoked
+
+                # avoid duplicate pings within same threshold
+                last_ping = LAST_PING.get(user.telegram_id)
+                if last_ping and (now - last_ping) < threshold:
+                    continue
+
+                avoided_cigs = int(inactivity.total_seconds() / 60 / max(user.interval_minutes, 1))
+                saved = avoided_cigs * user.cigarette_cost
+
+                text = (
+                    "👋 Маленький чек-ин!\n"
+                    f"Ты не заходил {INACTIVITY_HOURS}+ часов и уже сэкономил примерно {saved:.2f} zł. Продолжай в том же духе!"
+                )
+                await broadcast.submit(user.telegram_id, text, on_sent=_mark_pinged)
+    logger.info("Inactivity pings: %s", broadcast.stats)
 
 
 # ---------------------------------------------------------------------------
 # Adaptive growth daily job
 # ---------------------------------------------------------------------------
 
+@profiled("job adaptive_growth")
 async def run_adaptive_growth() -> None:
     from no_quitting_bot.core.usecases import adaptive_growth as adaptive_growth_uc
-    adaptive_growth_uc.execute(user_repo)
+    updated = await adaptive_growth_uc.execute_async(user_repo)
+    logger.info("Adaptive growth: %d users updated", updated)
 
 
 # ---------------------------------------------------------------------------
@@ -169,9 +223,28 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN env variable not set.")
 
-bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+# Base URL of a self-hosted Bot API server (or a stub in benchmarks); default is api.telegram.org
+TELEGRAM_API_URL = os.getenv("QS_TELEGRAM_API_URL")
+
+
+def create_bot() -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    new_bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML, session=session)
+    # never hold a DB transaction open across a Telegram round trip
+    new_bot.session.middleware(CommitBeforeRequestMiddleware())
+    new_bot.session.middleware(ApiMetricsMiddleware())  # inner, so commit time is not counted as API latency
+    return new_bot
+
+
+# The one Bot (and HTTP session) of the process, shared by handlers, jobs and the webhook app
+bot = create_bot()
+# FSM state persisted in the DB so onboarding survives restarts and is shared between workers
+storage = SqlAlchemyStorage()
+# Handlers are registered on this router; create_dispatcher() wires it up
+router = Router(name="quit_smoke")
+# One DB session / transaction / identity map per update
+uow_middleware = UnitOfWorkMiddleware()
+handler_metrics = HandlerMetricsMiddleware()
 
 # ---------------------------------------------------------------------------
 # FSM States
@@ -200,15 +273,21 @@ def _format_timedelta(seconds: int) -> str:
 # ---------------------------------------------------------------------------
 
 
-async def refresh_hub(user: User) -> None:
-    """Create or update the single hub message for the user."""
+async def refresh_hub(user: User, *, offer_delay: bool = True, bucket: TokenBucket | None = None) -> bool:
+    """Create or update the single hub message for the user.
+
+    Background renders pass ``offer_delay=False`` so they never send the
+    unsolicited "wait a bit longer" message, and a ``bucket`` to take a rate
+    token only when the hub actually changes. Returns whether the Bot API
+    was called.
+    """
 
     # Check for active alternative task
     alt = PENDING_ALTERNATIVES.get(user.telegram_id)
     now_dt = dt.datetime.utcnow()
     if alt and now_dt > alt["expires_at"]:
         # expired – remove
-        PENDING_ALTERNATIVES.pop(user.telegram_id, None)
+        await _clear_alternative(user)
         alt = None
 
     if alt:
@@ -216,43 +295,14 @@ async def refresh_hub(user: User) -> None:
             "💡 <b>Альтернатива:</b>\n"
             f"Сделай {alt['task']} за 2 мин"
         )
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text="✅ Сделал", callback_data="ALT_DONE")],
-                [InlineKeyboardButton(text="🚬 Курю сейчас", callback_data="SMOKE_NOW")],
-                [InlineKeyboardButton(text="🔄 Обновить", callback_data="REFRESH")],
-            ]
-        )
-        try:
-            if user.hub_message_id:
-                await bot.edit_message_text(
-                    chat_id=user.telegram_id,
-                    message_id=user.hub_message_id,
-                    text=text,
-                    reply_markup=keyboard,
-                    parse_mode=ParseMode.HTML,
-                )
-            else:
-                raise ValueError
-        except TelegramBadRequest as e:
-            if "message is not modified" in str(e).lower():
-                return
-            sent = await bot.send_message(user.telegram_id, text=text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
-            user.hub_message_id = sent.message_id
-            user_repo.update(user)
-        except Exception:
-            sent = await bot.send_message(user.telegram_id, text=text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
-            user.hub_message_id = sent.message_id
-            user_repo.update(user)
-        return
+        return await _show_hub(user, text, hub.ALTERNATIVE_KEYBOARD, bucket)
 
     # Compute whether user can smoke and seconds left
-    can_smoke, seconds_left = can_smoke_now_uc.execute(user.telegram_id, user_repo)
+    can_smoke, seconds_left = await can_smoke_now_uc.execute_async(user.telegram_id, user_repo)
 
-    # Cigarette stats today
-    today = dt.datetime.utcnow().date()
-    events_today = [e for e in event_repo.list_by_user(user.telegram_id) if e.timestamp.date() == today]
-    smoked_today = len(events_today)
+    # Cigarette stats today (single primary-key lookup in the daily rollup)
+    today_stats = await stats_repo.get(user.telegram_id, dt.datetime.utcnow().date())
+    smoked_today = today_stats.smoked if today_stats else 0
     plan_today = user.cigarettes_per_day
 
     # Build message
@@ -264,7 +314,7 @@ async def refresh_hub(user: User) -> None:
         seconds_left=seconds_left,
     )
 
-    last_event = event_repo.get_last(user.telegram_id)
+    last_event = await event_repo.get_last(user.telegram_id)
     allow_undo = False
     if last_event and last_event.id is not None:
         if (dt.datetime.utcnow() - last_event.timestamp).total_seconds() <= 10*60:
@@ -275,7 +325,7 @@ async def refresh_hub(user: User) -> None:
 
     # Редкое предложение подождать ещё 5-30 минут —
     # только когда до разрешённой сигареты осталось ≤ 10 мин.
-    if (not can_smoke) and seconds_left is not None and 0 < seconds_left <= 300:
+    if offer_delay and (not can_smoke) and seconds_left is not None and 0 < seconds_left <= 300:
         if random.random() < 0.05:  # ~5 % шанс
             extra = random.choice([5, 10, 15, 20, 25, 30])
             last_offer = user.last_delay_offer or dt.datetime.min
@@ -284,8 +334,24 @@ async def refresh_hub(user: User) -> None:
                     user.telegram_id,
                     f"🤔 Осталось всего {seconds_left // 60} мин. Может подождёшь ещё {extra} минут?"
                 )
-                user.last_delay_offer = dt.datetime.utcnow()
-                user_repo.update(user)
+                await user_repo.set_last_delay_offer(user, dt.datetime.utcnow())
+
+    return await _show_hub(user, text, keyboard, bucket)
+
+
+async def _show_hub(
+    user: User, text: str, keyboard: InlineKeyboardMarkup, bucket: TokenBucket | None = None
+) -> bool:
+    """Edit the user's hub message in place, or send a new one if that fails.
+
+    Renders identical to what the hub already shows are skipped without
+    calling the Bot API (or waiting for ``bucket``); returns False for those.
+    """
+    digest = hub_render_cache.digest(text, keyboard)
+    if hub_render_cache.is_current(user.telegram_id, user.hub_message_id, user.version, digest):
+        return False
+    if bucket is not None:
+        await bucket.acquire()
 
     try:
         if user.hub_message_id:
@@ -296,36 +362,229 @@ async def refresh_hub(user: User) -> None:
                 reply_markup=keyboard,
                 parse_mode=ParseMode.HTML,
             )
-        else:
-            raise ValueError
+            hub_render_cache.remember(user.telegram_id, user.hub_message_id, user.version, digest)
+            return True
+        raise ValueError
     except TelegramBadRequest as e:
         if "message is not modified" in str(e).lower():
-            return  # nothing to update
+            hub_render_cache.remember(user.telegram_id, user.hub_message_id, user.version, digest)
+            return True  # already showing this render
         # other bad request -> send new
-        sent = await bot.send_message(user.telegram_id, text=text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
-        user.hub_message_id = sent.message_id
-        user_repo.update(user)
     except Exception:
-        sent = await bot.send_message(user.telegram_id, text=text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
-        user.hub_message_id = sent.message_id
-        user_repo.update(user)
+        pass
+
+    sent = await bot.send_message(user.telegram_id, text=text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
+    await user_repo.set_hub_message_id(user, sent.message_id)
+    hub_render_cache.remember(user.telegram_id, sent.message_id, user.version, digest)
+    return True
 
 
 # ---------------------------------------------------------------------------
-# In-memory helpers to track last message IDs (simple, per session)
+# Last message IDs per user (edited in place instead of sending new ones)
 # ---------------------------------------------------------------------------
+MESSAGE_ID_TTL_SECONDS = 48 * 3600
+
+LAST_CAN_MSG: TTLStore[int, int] = make_state_store("last_can_msg", default_ttl=MESSAGE_ID_TTL_SECONDS)
+LAST_STATS_MSG: TTLStore[int, int] = make_state_store("last_stats_msg", default_ttl=MESSAGE_ID_TTL_SECONDS)
+
+STATE_STORES: list[TTLStore] = [PENDING_ALTERNATIVES, LAST_PING, LAST_CAN_MSG, LAST_STATS_MSG]
+
+
+async def start_state_stores() -> asyncio.Task:
+    """Restore persisted state and start the periodic expiry/flush task."""
+    for store in STATE_STORES:
+        await store.load()
+    return asyncio.create_task(run_maintenance(STATE_STORES))
+
+
+async def flush_state_stores() -> None:
+    for store in STATE_STORES:
+        await store.flush()
+
+
+# ---------------------------------------------------------------------------
+# "Can smoke now" timers
+# ---------------------------------------------------------------------------
+# When a user's next_allowed_time passes, the hub is refreshed for them so
+# nobody has to poll with REFRESH. Only the holder of the "smoke_timers" lease
+# keeps and fires timers, so with several workers each hub is refreshed once.
+# It schedules the changes its own handlers make. Every TIMER_RESYNC_SECONDS
+# it also reads the timers due within the next TIMER_LOOKAHEAD_SECONDS (an
+# index range scan) and schedules the ones it does not have yet, so another
+# worker's change is picked up before it is due as long as it lies at least
+# one resync ahead (a smoke sets it the 20+ minute interval ahead). Nothing else
+# is re-read, and the heap only holds the near future. A timer re-checks the
+# row before acting, so stale timers are harmless.
+TIMER_REFRESH_RATE_PER_SECOND = 10  # leaves most of Telegram's global limit to handlers
+TIMER_RESYNC_SECONDS = 60
+TIMER_LOOKAHEAD_SECONDS = 2 * TIMER_RESYNC_SECONDS  # overlapping windows: no timer slips between two reads
+
+timer_lease = LeaderLease("smoke_timers")
+_timer_resync = asyncio.Event()
+
+
+@profiled("timer can_smoke")
+async def _on_can_smoke(telegram_id: int) -> None:
+    await timer_bucket.acquire()
+    async with AsyncUnitOfWork():
+        user = await user_repo.get_by_telegram_id(telegram_id)
+        if not user or not user.next_allowed_time or not user.hub_message_id:
+            return
+        if user.next_allowed_time > dt.datetime.utcnow():
+            # moved (e.g. by another process) since this timer was set
+            smoke_timers.schedule(telegram_id, user.next_allowed_time)
+            return
+        await refresh_hub(user, offer_delay=False)
+
+
+smoke_timers: TimerService[int] = TimerService(_on_can_smoke)
+timer_bucket = TokenBucket(TIMER_REFRESH_RATE_PER_SECOND)
+
+
+def track_next_allowed(user: User) -> None:
+    """Keep the user's timer in sync after next_allowed_time changed."""
+    if not timer_lease.is_leader:
+        return  # the leader picks the change up on its next resync
+    if user.next_allowed_time and user.next_allowed_time > dt.datetime.utcnow():
+        smoke_timers.schedule(user.telegram_id, user.next_allowed_time)
+    else:
+        smoke_timers.cancel(user.telegram_id)
+
+
+async def _sync_smoke_timers() -> None:
+    """While leading, schedule the timers of the look-ahead window, on takeover and periodically."""
+    while True:
+        try:
+            async with asyncio.timeout(TIMER_RESYNC_SECONDS):
+                await _timer_resync.wait()
+        except TimeoutError:
+            pass
+        _timer_resync.clear()
+        if not timer_lease.is_leader:
+            continue
+        now = dt.datetime.utcnow()
+        try:
+            due_soon = await user_repo.list_next_allowed_between(now, now + dt.timedelta(seconds=TIMER_LOOKAHEAD_SECONDS))
+            for telegram_id, when in due_soon:
+                smoke_timers.schedule(telegram_id, when)  # no-op for timers already scheduled at that time
+            logger.debug("Synced %d smoke timers (%d pending)", len(due_soon), len(smoke_timers))
+        except Exception as e:
+            logger.warning("Smoke timer sync failed: %s", e)
+
+
+async def start_smoke_timers() -> asyncio.Future:
+    """Fire timers only while this process holds the timer lease.
+
+    Must be called inside the running loop; all tasks are created before it
+    returns. A follower's timer service stays empty, so its runner just
+    sleeps. Returns the future to pass to :func:`stop_smoke_timers`.
+    """
+    return asyncio.gather(
+        timer_lease.run(on_acquired=_timer_resync.set, on_lost=smoke_timers.clear),
+        _sync_smoke_timers(),
+        smoke_timers.run(),
+    )
+
+
+async def stop_smoke_timers(timers: asyncio.Future) -> None:
+    timers.cancel()
+    await asyncio.gather(timers, return_exceptions=True)
+    await timer_lease.release()
+
+
+# ---------------------------------------------------------------------------
+# Live countdown (optional, QS_LIVE_COUNTDOWN=1)
+# ---------------------------------------------------------------------------
+# Once a minute, hubs of recently active users are re-rendered so the
+# "До следующей сигареты: N мин" line stays current. Like the timers, waves
+# run only in the holder of the "smoke_timers" lease; every worker records
+# activity in users.last_seen_at (at most once per LIVE_COUNTDOWN_SEEN_SECONDS
+# per user), so the leader also sees users whose updates other workers got.
+# Renders run as one rate-limited wave; the next wave starts only after the
+# previous one ends, so a slow wave delays the next instead of piling up.
+# Users whose shown minute value is unchanged are skipped, and renders the
+# hub render cache already shows cost neither an API call nor a rate token.
+LIVE_COUNTDOWN = os.getenv("QS_LIVE_COUNTDOWN", "0") == "1"
+LIVE_COUNTDOWN_INTERVAL_SECONDS = 60
+LIVE_COUNTDOWN_ACTIVE_MINUTES = 15
+LIVE_COUNTDOWN_RATE_PER_SECOND = 5
+LIVE_COUNTDOWN_SEEN_SECONDS = 60
+
+_seen_recorded: TTLStore[int, bool] = TTLStore(default_ttl=LIVE_COUNTDOWN_SEEN_SECONDS)
+countdown_bucket = TokenBucket(LIVE_COUNTDOWN_RATE_PER_SECOND)
+_countdown_shown: dict[int, int] = {}  # telegram_id -> minutes value of the last wave render
+
+
+async def _track_activity(handler, event, data):  # noqa: ANN001
+    if LIVE_COUNTDOWN and (from_user := data.get("event_from_user")) is not None:
+        # not throttled until the user row exists (onboarding)
+        if from_user.id not in _seen_recorded and await user_repo.mark_seen(from_user.id, dt.datetime.utcnow()):
+            _seen_recorded[from_user.id] = True
+    return await handler(event, data)
+
+
+def _countdown_minutes(user: User) -> int | None:
+    """Minutes the hub's countdown shows, or None if nothing is counting down."""
+    now = dt.datetime.utcnow()
+    if not user.hub_message_id or not user.next_allowed_time or user.next_allowed_time <= now:
+        return None  # the smoke timer handles reaching zero
+    return int((user.next_allowed_time - now).total_seconds()) // 60
+
+
+@profiled("countdown wave")
+async def countdown_wave() -> int:
+    """Re-render countdown hubs of active users; returns the number of Bot API renders."""
+    _seen_recorded.sweep()
+    if not timer_lease.is_leader:
+        _countdown_shown.clear()  # a new leader starts from scratch
+        return 0
+
+    active_since = dt.datetime.utcnow() - dt.timedelta(minutes=LIVE_COUNTDOWN_ACTIVE_MINUTES)
+    # one indexed read picks the active hubs whose minute changed ...
+    candidates = await user_repo.list_seen_since(active_since)
+    for telegram_id in set(_countdown_shown) - {c.telegram_id for c in candidates}:
+        del _countdown_shown[telegram_id]
+
+    rendered = 0
+    for candidate in candidates:
+        minutes = _countdown_minutes(candidate)
+        if minutes is None or _countdown_shown.get(candidate.telegram_id) == minutes:
+            continue
+        async with AsyncUnitOfWork():
+            # ... but the render uses a fresh row: the batch may be stale after the previous renders
+            user = await user_repo.get_by_telegram_id(candidate.telegram_id)
+            if user is None or (minutes := _countdown_minutes(user)) is None:
+                continue
+            if await refresh_hub(user, offer_delay=False, bucket=countdown_bucket):
+                rendered += 1
+        _countdown_shown[user.telegram_id] = minutes
+    return rendered
+
+
+async def run_live_countdown() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        try:
+            rendered = await countdown_wave()
+            if rendered:
+                logger.info("Countdown wave: %d hubs in %.1fs", rendered, loop.time() - started)
+        except Exception as e:
+            logger.warning("Countdown wave failed: %s", e)
+        await asyncio.sleep(max(LIVE_COUNTDOWN_INTERVAL_SECONDS - (loop.time() - started), 0))
+
 
-LAST_CAN_MSG: dict[int, int] = {}
-LAST_STATS_MSG: dict[int, int] = {}
+def start_live_countdown() -> asyncio.Task | None:
+    return asyncio.create_task(run_live_countdown()) if LIVE_COUNTDOWN else None
 
 # ---------------------------------------------------------------------------
 # Handlers
 # ---------------------------------------------------------------------------
 
-@dp.message(CommandStart())
+@router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext) -> None:
     """Greet new users and start onboarding if not configured."""
-    user = user_repo.get_by_telegram_id(message.from_user.id)
+    user = await user_repo.get_by_telegram_id(message.from_user.id)
     if user:
         await refresh_hub(user)
         return
@@ -339,7 +598,7 @@ async def cmd_start(message: Message, state: FSMContext) -> None:
 # ---------------------------------------------------------------------------
 
 
-@dp.message(SetupState.cigarettes_per_day)
+@router.message(SetupState.cigarettes_per_day)
 async def setup_cigs_per_day(message: Message, state: FSMContext) -> None:
     try:
         cigs_per_day = int(message.text)
@@ -354,7 +613,7 @@ async def setup_cigs_per_day(message: Message, state: FSMContext) -> None:
     await message.answer("Сколько стоит пачка сигарет (в zł)?")
 
 
-@dp.message(SetupState.price_per_pack)
+@router.message(SetupState.price_per_pack)
 async def setup_price_per_pack(message: Message, state: FSMContext) -> None:
     try:
         price_per_pack = float(message.text.replace(",", "."))
@@ -369,7 +628,7 @@ async def setup_price_per_pack(message: Message, state: FSMContext) -> None:
     await message.answer("Сколько сигарет в одной пачке?")
 
 
-@dp.message(SetupState.cigs_per_pack)
+@router.message(SetupState.cigs_per_pack)
 async def setup_cigs_per_pack(message: Message, state: FSMContext) -> None:
     try:
         cigs_per_pack = int(message.text)
@@ -380,7 +639,7 @@ async def setup_cigs_per_pack(message: Message, state: FSMContext) -> None:
         return
 
     data = await state.get_data()
-    user = init_user_uc.execute(
+    user = await init_user_uc.execute_async(
         telegram_id=message.from_user.id,
         cigarettes_per_day=data["cigs_per_day"],
         price_per_pack=data["price_per_pack"],
@@ -394,7 +653,7 @@ async def setup_cigs_per_pack(message: Message, state: FSMContext) -> None:
     await refresh_hub(user)
 
 
-@dp.message(Command("setup"))
+@router.message(Command("setup"))
 async def cmd_setup(message: Message) -> None:
     parts = message.text.split()
     if len(parts) != 4:
@@ -409,7 +668,7 @@ async def cmd_setup(message: Message) -> None:
         await message.reply("Не получилось распознать числа. Попробуй ещё раз.")
         return
 
-    user = init_user_uc.execute(
+    user = await init_user_uc.execute_async(
         telegram_id=message.from_user.id,
         cigarettes_per_day=cigs_per_day,
         price_per_pack=price_per_pack,
@@ -426,10 +685,10 @@ async def cmd_setup(message: Message) -> None:
     )
 
 
-@dp.message(F.text == "🚬 Можно курить?")
+@router.message(F.text == "🚬 Можно курить?")
 async def handle_can_button(message: Message) -> None:
     try:
-        can_smoke, seconds_left = can_smoke_now_uc.execute(message.from_user.id, user_repo)
+        can_smoke, seconds_left = await can_smoke_now_uc.execute_async(message.from_user.id, user_repo)
     except ValueError as exc:
         await message.reply(str(exc))
         return
@@ -469,9 +728,9 @@ async def handle_can_button(message: Message) -> None:
             LAST_CAN_MSG[message.from_user.id] = sent.message_id
 
 
-@dp.message(F.text == "📊 Статистика")
+@router.message(F.text == "📊 Статистика")
 async def handle_stats_button(message: Message) -> None:
-    user = user_repo.get_by_telegram_id(message.from_user.id)
+    user = await user_repo.get_by_telegram_id(message.from_user.id)
     if not user:
         await message.reply("Сначала настрой бота командой /start!")
         return
@@ -505,9 +764,9 @@ async def handle_stats_button(message: Message) -> None:
     LAST_STATS_MSG[message.from_user.id] = sent.message_id
 
 
-@dp.callback_query(F.data == "SMOKE_NOW")
+@router.callback_query(F.data == "SMOKE_NOW")
 async def handle_smoke_now(callback: CallbackQuery) -> None:
-    user = user_repo.get_by_telegram_id(callback.from_user.id)
+    user = await user_repo.get_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.answer("Ошибка: пользователь не найден", show_alert=True)
         return
@@ -519,44 +778,53 @@ async def handle_smoke_now(callback: CallbackQuery) -> None:
     if alt:
         if now_dt <= alt["expires_at"]:
             # relapse – early smoke
-            register_smoke_uc.execute(
-                telegram_id=user.telegram_id,
-                user_repo=user_repo,
-                event_repo=event_repo,
-            )
-            user_repo.update(user)
+            try:
+                await register_smoke_uc.execute_async(
+                    telegram_id=user.telegram_id,
+                    user_repo=user_repo,
+                    event_repo=event_repo,
+                    stats_repo=stats_repo,
+                )
+            except ConcurrentUpdateError:
+                await callback.answer(RETRY_TEXT, show_alert=True)
+                return
             PENDING_ALTERNATIVES.pop(user.telegram_id, None)
             await callback.answer("Срыв зафиксирован")
+            user = await user_repo.get_by_telegram_id(user.telegram_id)
+            track_next_allowed(user)
             await refresh_hub(user)
             return
         else:
-            PENDING_ALTERNATIVES.pop(user.telegram_id, None)
+            await _clear_alternative(user)
 
     # Allowed?
-    can_smoke, _ = can_smoke_now_uc.execute(user.telegram_id, user_repo)
+    can_smoke, _ = await can_smoke_now_uc.execute_async(user.telegram_id, user_repo)
     if can_smoke:
-        register_smoke_uc.execute(
-            telegram_id=user.telegram_id,
-            user_repo=user_repo,
-            event_repo=event_repo,
-        )
+        try:
+            await register_smoke_uc.execute_async(
+                telegram_id=user.telegram_id,
+                user_repo=user_repo,
+                event_repo=event_repo,
+                stats_repo=stats_repo,
+            )
+        except ConcurrentUpdateError:
+            await callback.answer(RETRY_TEXT, show_alert=True)
+            return
         await callback.answer("Сигарета зафиксирована")
+        user = await user_repo.get_by_telegram_id(user.telegram_id)
+        track_next_allowed(user)
         await refresh_hub(user)
         return
 
     # Early attempt – propose alternative (токены/воля исключены)
-    task_text = random.choice(ALTERNATIVE_TASKS)
-    PENDING_ALTERNATIVES[user.telegram_id] = {
-        "expires_at": now_dt + dt.timedelta(minutes=2),
-        "task": task_text,
-    }
+    await _set_alternative(user, random.choice(ALTERNATIVE_TASKS))
     await callback.answer("Попробуй альтернативу 💪")
     await refresh_hub(user)
 
 
-@dp.callback_query(F.data == "ALT_DONE")
+@router.callback_query(F.data == "ALT_DONE")
 async def handle_alt_done(callback: CallbackQuery) -> None:
-    user = user_repo.get_by_telegram_id(callback.from_user.id)
+    user = await user_repo.get_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.answer("Ошибка", show_alert=True)
         return
@@ -564,52 +832,68 @@ async def handle_alt_done(callback: CallbackQuery) -> None:
     alt = PENDING_ALTERNATIVES.get(user.telegram_id)
     now_dt = dt.datetime.utcnow()
     if not alt or now_dt > alt["expires_at"]:
-        PENDING_ALTERNATIVES.pop(user.telegram_id, None)
+        await _clear_alternative(user)
         await callback.answer("Время вышло", show_alert=True)
         await refresh_hub(user)
         return
 
     # Success – просто сдвигаем разрешённое время на 3 минуты
-    user.next_allowed_time = (user.next_allowed_time or now_dt) + dt.timedelta(minutes=3)
-    user_repo.update(user)
+    # (compare-and-swap; if a concurrent smoke/undo changed the row, recompute from the fresh one)
+    for _ in range(register_smoke_uc.CAS_ATTEMPTS):
+        new_time = (user.next_allowed_time or now_dt) + dt.timedelta(minutes=3)
+        if await user_repo.set_next_allowed_if_version(user, new_time):
+            break
+        user = await user_repo.get_by_telegram_id(callback.from_user.id)
+        if not user:
+            await callback.answer("Ошибка", show_alert=True)
+            return
+    else:
+        await callback.answer(RETRY_TEXT, show_alert=True)
+        return
 
     PENDING_ALTERNATIVES.pop(user.telegram_id, None)
+    track_next_allowed(user)
 
     await callback.answer("Отлично!")
     await refresh_hub(user)
 
 
-@dp.callback_query(F.data == "UNDO")
+@router.callback_query(F.data == "UNDO")
 async def handle_undo(callback: CallbackQuery) -> None:
     from no_quitting_bot.core.usecases import undo_last_event as undo_uc
 
     try:
-        undo_uc.execute(callback.from_user.id, user_repo, event_repo)
+        await undo_uc.execute_async(callback.from_user.id, user_repo, event_repo, stats_repo)
         await callback.answer("Отменено")
-    except Exception as exc:
+    except undo_uc.CannotUndo as exc:
         await callback.answer(str(exc), show_alert=True)
+    except ConcurrentUpdateError:
+        await callback.answer(RETRY_TEXT, show_alert=True)
 
-    user = user_repo.get_by_telegram_id(callback.from_user.id)
+    user = await user_repo.get_by_telegram_id(callback.from_user.id)
     if user:
+        track_next_allowed(user)
         await refresh_hub(user)
 
 
 # TOKEN_SMOKE и DELAY функциональности удалены
 
 
-@dp.callback_query(F.data == "REFRESH")
+@router.callback_query(F.data == "REFRESH")
 async def handle_refresh(callback: CallbackQuery) -> None:
-    user = user_repo.get_by_telegram_id(callback.from_user.id)
+    user = await user_repo.get_by_telegram_id(callback.from_user.id)
     if user:
         await refresh_hub(user)
     await callback.answer("Обновлено")
 
 
-@dp.callback_query(F.data == "FAQ")
+@router.callback_query(F.data == "FAQ")
 async def handle_faq(callback: CallbackQuery) -> None:
     text = (
         "ℹ️ <b>FAQ / Команды</b>\n"
         "• /start — запустить бота и показать хаб\n"
+        "• /history — история сигарет\n"
+        "• /export — выгрузить все данные (CSV, или /export json)\n"
         "• /reset — сбросить все настройки\n\n"
         "В хабе доступны: \n"
         "🚬 Курю сейчас — фиксирует сигарету (если разрешено) \n"
@@ -619,25 +903,88 @@ async def handle_faq(callback: CallbackQuery) -> None:
     await bot.send_message(callback.from_user.id, text, parse_mode=ParseMode.HTML)
 
 
+# ---------------------------------------------------------------------------
+# History (keyset-paginated; the buttons carry the cursor)
+# ---------------------------------------------------------------------------
+
+
+@router.message(Command("history"))
+async def cmd_history(message: Message) -> None:
+    page = await history_uc.execute_async(message.from_user.id, event_repo)
+    await message.answer(
+        history.build_history_text(page),
+        reply_markup=history.build_history_keyboard(page),
+        parse_mode=ParseMode.HTML,
+    )
+
+
+@router.callback_query(history.HistoryCallback.filter())
+async def handle_history_page(callback: CallbackQuery, callback_data: history.HistoryCallback) -> None:
+    if callback_data.direction == "newer":
+        page = await history_uc.execute_async(callback.from_user.id, event_repo, newer_than=callback_data.cursor)
+    else:
+        page = await history_uc.execute_async(callback.from_user.id, event_repo, older_than=callback_data.cursor)
+    await callback.answer()
+    try:
+        await bot.edit_message_text(
+            chat_id=callback.from_user.id,
+            message_id=callback.message.message_id,
+            text=history.build_history_text(page),
+            reply_markup=history.build_history_keyboard(page),
+            parse_mode=ParseMode.HTML,
+        )
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+
+
+# ---------------------------------------------------------------------------
+# Data export (streamed: keyset-chunked reads, serialization in a thread)
+# ---------------------------------------------------------------------------
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject) -> None:
+    fmt = (command.args or "csv").strip().lower()
+    if fmt not in export.FORMATS:
+        await message.reply("Формат: /export (CSV) или /export json")
+        return
+
+    telegram_id = message.from_user.id
+    async with export.export_history(telegram_id, event_repo.iter_by_user(telegram_id), fmt) as result:
+        if not result.events:
+            await message.reply("📭 Пока нечего выгружать — ещё ни одной сигареты не записано.")
+            return
+        for document in result.files:
+            await bot.send_document(message.chat.id, document)
+    logger.info("Export for %s: %d events as %s", telegram_id, result.events, fmt)
+
+
 # ---------------------------------------------------------------------------
 # Reset command
 # ---------------------------------------------------------------------------
 
 
-@dp.message(Command("reset"))
-@dp.message(F.text == "⚙️ Сброс")
+@router.message(Command("reset"))
+@router.message(F.text == "⚙️ Сброс")
 async def cmd_reset(message: Message, state: FSMContext) -> None:
     """Delete user and restart onboarding."""
-    existing = user_repo.get_by_telegram_id(message.from_user.id)
+    existing = await user_repo.get_by_telegram_id(message.from_user.id)
     if existing:
         # naive delete via direct session (simple for now)
-        from no_quitting_bot.dataproviders.db import session_scope
-        from no_quitting_bot.dataproviders.repositories._models import UserModel, SmokingEventModel
+        from no_quitting_bot.dataproviders.db import async_session_scope
+        from no_quitting_bot.dataproviders.repositories._models import (
+            DailyUserStatsModel,
+            SmokingEventModel,
+            UserModel,
+        )
         from sqlalchemy import delete
 
-        with session_scope() as session:
-            session.execute(delete(SmokingEventModel).where(SmokingEventModel.user_id == existing.telegram_id))
-            session.execute(delete(UserModel).where(UserModel.telegram_id == existing.telegram_id))
+        async with async_session_scope() as session:
+            await session.execute(delete(SmokingEventModel).where(SmokingEventModel.user_id == existing.telegram_id))
+            await session.execute(delete(DailyUserStatsModel).where(DailyUserStatsModel.user_id == existing.telegram_id))
+            await session.execute(delete(UserModel).where(UserModel.telegram_id == existing.telegram_id))
+        smoke_timers.cancel(existing.telegram_id)
 
     await state.clear()
     await message.answer("⚠️ Настройки сброшены. Давай начнём заново! Сколько сигарет в день ты обычно выкуриваешь?")
@@ -645,27 +992,147 @@ async def cmd_reset(message: Message, state: FSMContext) -> None:
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Scheduled jobs & leader election
 # ---------------------------------------------------------------------------
 
 
-async def _runner() -> None:
-    """Async runner: start scheduler and polling concurrently."""
-    # Scheduler must be started inside running loop
-    scheduler.start()
-    await dp.start_polling(bot)
+def get_scheduler() -> AsyncIOScheduler:
+    """The process scheduler, created (and APScheduler imported) on first use."""
+    global scheduler
+    if scheduler is None:
+        from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+        scheduler = AsyncIOScheduler(timezone="UTC")
+        scheduler.add_listener(
+            _record_job, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+        )
+    return scheduler
 
-def main() -> None:
-    logger.info("Starting QuitSmokeBot...")
 
+def schedule_jobs() -> None:
+    sched = get_scheduler()
     # Schedule weekly reports: every Monday 09:00 UTC
-    scheduler.add_job(send_weekly_reports, "cron", day_of_week="mon", hour=9, minute=0)
+    sched.add_job(
+        send_weekly_reports, "cron", day_of_week="mon", hour=9, minute=0, id="weekly_reports", replace_existing=True
+    )
     # Daily adaptive growth task at 02:00 UTC
-    scheduler.add_job(run_adaptive_growth, "cron", hour=2, minute=0)
+    sched.add_job(run_adaptive_growth, "cron", hour=2, minute=0, id="adaptive_growth", replace_existing=True)
     # Inactivity ping every hour
-    scheduler.add_job(send_inactivity_pings, "cron", minute=0)
+    sched.add_job(send_inactivity_pings, "cron", minute=0, id="inactivity_pings", replace_existing=True)
+
+
+async def start_scheduler() -> asyncio.Task:
+    """Start the scheduler paused; it is resumed only while we hold the lease.
+
+    Must be called inside the running loop. Returns the election task.
+    """
+    schedule_jobs()
+    sched = get_scheduler()
+    if not sched.running:
+        sched.start(paused=True)
+    return asyncio.create_task(scheduler_lease.run(on_acquired=sched.resume, on_lost=sched.pause))
+
+
+async def stop_scheduler(election: asyncio.Task) -> None:
+    election.cancel()
+    await asyncio.gather(election, return_exceptions=True)
+    await scheduler_lease.release()
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
 
+
+# ---------------------------------------------------------------------------
+# Metrics (served on /metrics by the webhook app)
+# ---------------------------------------------------------------------------
+_job_started: dict[str, float] = {}
+
+
+def _record_job(event: JobEvent) -> None:
+    from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+
+    if event.code == EVENT_JOB_SUBMITTED:
+        _job_started[event.job_id] = time.perf_counter()
+        return
+    status = {EVENT_JOB_EXECUTED: "ok", EVENT_JOB_ERROR: "error"}.get(event.code, "missed")
+    metrics.JOB_RUNS.inc(event.job_id, status)
+    started = _job_started.pop(event.job_id, None)
+    if started is not None:
+        metrics.JOB_SECONDS.observe(time.perf_counter() - started, event.job_id)
+
+
+def _state_sizes() -> dict[tuple[str, ...], int]:
+    return {
+        ("pending_alternatives",): len(PENDING_ALTERNATIVES),
+        ("last_ping",): len(LAST_PING),
+        ("last_can_msg",): len(LAST_CAN_MSG),
+        ("last_stats_msg",): len(LAST_STATS_MSG),
+        ("seen_recorded",): len(_seen_recorded),
+        ("countdown_shown",): len(_countdown_shown),
+        ("hub_render_cache",): len(hub_render_cache),
+        ("smoke_timers",): len(smoke_timers),
+    }
+
+
+metrics.REGISTRY.gauge("qs_state_entries", "Entries in in-memory state stores and caches", _state_sizes, ("store",))
+metrics.REGISTRY.gauge(
+    "qs_scheduler_leader", "1 while this process runs the scheduled jobs", lambda: scheduler_lease.is_leader
+)
+metrics.REGISTRY.gauge(
+    "qs_smoke_timer_leader", "1 while this process fires the smoke timers", lambda: timer_lease.is_leader
+)
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher factory
+# ---------------------------------------------------------------------------
+
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher with the bot's middlewares and handlers.
+
+    Call once per process: the handler router can be attached to a single
+    dispatcher only.
+    """
+    dispatcher = Dispatcher(storage=storage)
+    # Opt-in per-update SQL profile (QS_SQL_PROFILE=1), outside the unit of work so its commit counts
+    if query_profiler.ENABLED:
+        dispatcher.update.outer_middleware(QueryProfilerMiddleware())
+    dispatcher.update.outer_middleware(uow_middleware)
+    dispatcher.update.outer_middleware(_track_activity)
+    dispatcher.message.middleware(handler_metrics)
+    dispatcher.callback_query.middleware(handler_metrics)
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+
+async def _runner() -> None:
+    """Async runner: start scheduler and polling concurrently."""
+    run_migrations()
+    dp = create_dispatcher()
+    election = await start_scheduler()
+    maintenance = await start_state_stores()
+    timers = await start_smoke_timers()
+    countdown = start_live_countdown()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if countdown is not None:
+            countdown.cancel()
+        await stop_smoke_timers(timers)
+        await stop_scheduler(election)
+        maintenance.cancel()
+        await flush_state_stores()
+        await storage.close()
+
+
+def main() -> None:
+    logger.info("Starting QuitSmokeBot...")
     asyncio.run(_runner())
 
 
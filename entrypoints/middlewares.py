@@ -0,0 +1,141 @@
+"""aiogram middlewares shared by the polling and webhook entrypoints."""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from no_quitting_bot.dataproviders.db import AsyncUnitOfWork, current_unit_of_work
+from no_quitting_bot.dataproviders.query_profiler import profile_scope
+from no_quitting_bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """Wrap every update in a single :class:`AsyncUnitOfWork`.
+
+    Keeps running totals so the average number of SQL queries per update can
+    be inspected (``queries / updates``).
+    """
+
+    def __init__(self) -> None:
+        self.updates = 0
+        self.queries = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        uow = AsyncUnitOfWork()
+        try:
+            async with uow:
+                data["uow"] = uow
+                return await handler(event, data)
+        finally:
+            self.updates += 1
+            self.queries += uow.query_count
+            if isinstance(event, Update):
+                logger.debug(
+                    "update %s (%s): %d SQL queries",
+                    event.update_id,
+                    event.event_type,
+                    uow.query_count,
+                )
+
+
+class QueryProfilerMiddleware(BaseMiddleware):
+    """Outer middleware: profile the SQL of each update (see ``query_profiler``).
+
+    Register it before :class:`UnitOfWorkMiddleware` so the final commit is
+    attributed to the update too.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        label = f"update {event.update_id} ({event.event_type})" if isinstance(event, Update) else type(event).__name__
+        if isinstance(event, Update) and event.callback_query is not None:
+            label += f" {event.callback_query.data}"
+        with profile_scope(label):
+            return await handler(event, data)
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """Bot API request middleware: commit the update's unit of work before calling Telegram.
+
+    SQLite has a single writer, so a transaction kept open across a Telegram
+    round trip blocks every other update's writes (and holds a pooled
+    connection) for that long. Committing first also means a failed API call
+    no longer rolls back DB changes that already happened.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        uow = current_unit_of_work()
+        if uow is not None:
+            await uow.commit()
+        return await make_request(bot, method)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: time each matched handler, labelled by its name and callback data.
+
+    Only the part before the first ``:`` is used, so callback data carrying
+    parameters (``HIST:older:...``) keeps the label bounded.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        callback_data = (event.data or "").split(":", 1)[0] if isinstance(event, CallbackQuery) else ""
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.HANDLER_SECONDS.observe(time.perf_counter() - started, name, callback_data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot API request middleware: count and time calls per method."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        status = "error"
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+            status = "ok"
+            return response
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            metrics.API_SECONDS.observe(time.perf_counter() - started, name)
+            metrics.API_REQUESTS.inc(name, status)
@@ -4,6 +4,7 @@ Render expects a web process that listens on PORT env var. We launch aiohttp web
 """
 from __future__ import annotations
 
+import asyncio
 import os
 import logging
 
@@ -11,38 +12,95 @@ from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from no_quitting_bot.entrypoints import bot_main  # re-use configured dispatcher & scheduler
+from no_quitting_bot.dataproviders.db import run_migrations
+from no_quitting_bot.entrypoints import bot_main  # re-use bot, handlers & scheduler
+from no_quitting_bot.utils import metrics
+from no_quitting_bot.utils.update_workers import ShardedRequestHandler
 
 logger = logging.getLogger(__name__)
 
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise RuntimeError("BOT_TOKEN env variable not set")
-
 BASE_URL = os.getenv("BASE_URL")  # e.g. https://my-bot.onrender.com
 if not BASE_URL:
     raise RuntimeError("BASE_URL env variable not set (Render -> Environment)" )
 
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "qsbotsecret")
-
-bot: Bot = Bot(BOT_TOKEN, parse_mode="HTML")
-dp: Dispatcher = bot_main.dp  # same dispatcher with all handlers & scheduler
+# Updates are acknowledged immediately and processed by per-user ordered
+# workers; QS_WEBHOOK_SHARDS=0 handles them inside the HTTP request instead.
+WEBHOOK_SHARDS = int(os.getenv("QS_WEBHOOK_SHARDS", "16"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("QS_WEBHOOK_QUEUE_SIZE", "100"))  # per shard
+# If set, GET /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("QS_METRICS_TOKEN")
+# Unregister the webhook when this process stops. The webhook is shared by
+# every worker, so only enable this for a single-process deployment.
+DELETE_WEBHOOK_ON_EXIT = os.getenv("QS_DELETE_WEBHOOK_ON_EXIT", "0") == "1"
+
+bot: Bot = bot_main.bot  # one Bot and HTTP session for handlers, jobs and the webhook
+dp: Dispatcher = bot_main.create_dispatcher()
 
 app = web.Application()
 
+
+async def register_webhook() -> None:
+    """Point Telegram at this service (use render external URL).
+
+    Runs in the background: on a restart Telegram already has the webhook and
+    queues updates until we listen, so the round trip need not delay serving.
+    """
+    try:
+        await bot.set_webhook(f"{BASE_URL}/webhook", secret_token=WEBHOOK_SECRET)
+        logger.info("Webhook set")
+    except Exception as e:
+        logger.error("Failed to set webhook: %s", e)
+
+
 async def on_startup(app: web.Application):
-    # Use render external URL
-    await bot.set_webhook(f"{BASE_URL}/webhook", secret_token=WEBHOOK_SECRET)
-    # start scheduled jobs (weekly report, adaptive growth, inactivity pings)
-    if not bot_main.scheduler.running:
-        bot_main.scheduler.start()
-    logger.info("Webhook set and scheduler started")
+    run_migrations()  # before anything touches the DB
+    app["webhook_registration"] = asyncio.create_task(register_webhook())
+    # start scheduled jobs (weekly report, adaptive growth, inactivity pings);
+    # with several web workers only the lease holder runs them
+    app["scheduler_election"] = await bot_main.start_scheduler()
+    app["state_maintenance"] = await bot_main.start_state_stores()
+    # "can smoke" timers likewise fire in one worker only
+    app["smoke_timers"] = await bot_main.start_smoke_timers()
+    app["live_countdown"] = bot_main.start_live_countdown()
+    logger.info("Scheduler started")
 
 async def on_cleanup(app: web.Application):
-    await bot.delete_webhook()
+    app["webhook_registration"].cancel()
+    if DELETE_WEBHOOK_ON_EXIT:
+        await bot.delete_webhook()
+    await bot_main.stop_scheduler(app["scheduler_election"])
+    await bot_main.stop_smoke_timers(app["smoke_timers"])
+    if app["live_countdown"] is not None:
+        app["live_countdown"].cancel()
+    app["state_maintenance"].cancel()
+    await bot_main.flush_state_stores()
+    await bot_main.storage.close()
 
 # Register aiogram request handler
-SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path="/webhook")
+if WEBHOOK_SHARDS > 0:
+    webhook_handler: SimpleRequestHandler = ShardedRequestHandler(
+        dispatcher=dp, bot=bot, shards=WEBHOOK_SHARDS, queue_size=WEBHOOK_QUEUE_SIZE, secret_token=WEBHOOK_SECRET
+    )
+else:
+    webhook_handler = SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=False, secret_token=WEBHOOK_SECRET)
+webhook_handler.register(app, path="/webhook")
+
+if isinstance(webhook_handler, ShardedRequestHandler):
+    queue_stats = webhook_handler.processor.stats
+    metrics.REGISTRY.gauge("qs_update_queue_depth", "Webhook updates waiting for a worker", lambda: queue_stats.depth)
+    metrics.REGISTRY.gauge(
+        "qs_update_queue_rejected", "Webhook updates answered with 503 (queue full)", lambda: queue_stats.rejected
+    )
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise web.HTTPUnauthorized()
+    # Prometheus text exposition format 0.0.4
+    return web.Response(text=metrics.REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+app.router.add_get("/metrics", metrics_handler)
 
 # Apply aiogram middlewares to aiohttp app
 setup_application(app, dp, bot=bot)
@@ -0,0 +1,190 @@
+"""Rate-limited concurrent dispatcher for outbound broadcast messages."""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows ~30 msg/s globally and ~1 msg/s per private chat
+GLOBAL_RATE_PER_SECOND = 25.0
+PER_CHAT_INTERVAL_SECONDS = 1.0
+DEFAULT_CONCURRENCY = 20
+MAX_RETRIES = 5
+
+
+@dataclass(slots=True)
+class BroadcastStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"sent={self.sent} failed={self.failed} retried={self.retried} "
+            f"elapsed={self.elapsed:.1f}s rate={self.throughput:.1f} msg/s"
+        )
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass(slots=True)
+class _Outgoing:
+    chat_id: int
+    text: str
+    kwargs: dict[str, Any]
+    on_sent: Optional[Callable[[int], Any]]
+    attempts: int = 0
+
+
+class BroadcastDispatcher:
+    """Send many messages concurrently without exceeding Telegram limits.
+
+    Usage::
+
+        async with BroadcastDispatcher(bot) as broadcast:
+            for chat_id in chats:
+                await broadcast.submit(chat_id, "text")
+        logger.info("done: %s", broadcast.stats)
+
+    ``submit`` blocks when the internal queue is full, so producers streaming
+    from the DB never buffer more than a few batches. ``TelegramRetryAfter``
+    pauses all workers for the requested time and the message is retried.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate_per_second: float = GLOBAL_RATE_PER_SECOND,
+        per_chat_interval: float = PER_CHAT_INTERVAL_SECONDS,
+        max_retries: int = MAX_RETRIES,
+    ) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.stats = BroadcastStats()
+        self._bucket = TokenBucket(rate_per_second)
+        self._queue: asyncio.Queue[_Outgoing | None] = asyncio.Queue(maxsize=concurrency * 4)
+        self._chat_next_at: dict[int, float] = {}
+        self._paused_until = 0.0
+        self._workers: list[asyncio.Task] = []
+
+    async def __aenter__(self) -> "BroadcastDispatcher":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.join()
+
+    def start(self) -> None:
+        self.stats = BroadcastStats()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def submit(
+        self,
+        chat_id: int,
+        text: str,
+        on_sent: Optional[Callable[[int], Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Queue a ``send_message``; ``on_sent(chat_id)`` runs after delivery."""
+        await self._queue.put(_Outgoing(chat_id, text, kwargs, on_sent))
+
+    async def join(self) -> BroadcastStats:
+        """Wait until everything submitted is delivered (or failed), then stop workers."""
+        for _ in self._workers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._workers)
+        self._workers = []
+        self.stats.finished_at = time.monotonic()
+        return self.stats
+
+    # ---------------------------------------------------------------------
+    # Internals
+    # ---------------------------------------------------------------------
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        now = time.monotonic()
+        next_at = self._chat_next_at.get(chat_id, 0.0)
+        self._chat_next_at[chat_id] = max(now, next_at) + self.per_chat_interval
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+        if len(self._chat_next_at) > 10_000:
+            self._chat_next_at = {k: v for k, v in self._chat_next_at.items() if v > now}
+
+    async def _wait_if_paused(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _worker(self) -> None:
+        while (item := await self._queue.get()) is not None:
+            await self._deliver(item)
+
+    async def _deliver(self, item: _Outgoing) -> None:
+        while True:
+            await self._wait_if_paused()
+            await self._wait_for_chat(item.chat_id)
+            await self._bucket.acquire()
+            item.attempts += 1
+            try:
+                await self.bot.send_message(chat_id=item.chat_id, text=item.text, **item.kwargs)
+            except TelegramRetryAfter as e:
+                if item.attempts > self.max_retries:
+                    self.stats.failed += 1
+                    logger.warning("Giving up on %s after %d flood waits", item.chat_id, item.attempts)
+                    return
+                self.stats.retried += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                continue
+            except Exception as e:
+                self.stats.failed += 1
+                logger.warning("Failed to send broadcast message to %s: %s", item.chat_id, e)
+                return
+
+            self.stats.sent += 1
+            if item.on_sent is not None:
+                result = item.on_sent(item.chat_id)
+                if inspect.isawaitable(result):
+                    await result
+            return
@@ -0,0 +1,215 @@
+"""Streaming export of a user's smoking history (/export).
+
+Events arrive from the repository in keyset-paginated chunks, oldest first.
+Each chunk is serialized in a worker thread into a spooled temporary file
+(kept in memory up to ``SPOOL_MAX_BYTES``, then on disk), and per-day
+aggregates are folded in as the stream passes, one open day at a time. So
+memory is bounded by the chunk size whatever the length of the history,
+and the event loop only ever awaits.
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import csv
+import datetime as dt
+import json
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import IO, TYPE_CHECKING, Any, AsyncGenerator, AsyncIterator, Dict, List
+
+from aiogram.types import InputFile
+
+from no_quitting_bot.core.entities.smoking_event import SmokingEvent
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+FORMATS = ("csv", "json")
+SPOOL_MAX_BYTES = 1024 * 1024
+
+EVENT_FIELDS = (
+    "id",
+    "timestamp",
+    "planned_time",
+    "was_early",
+    "interval_before",
+    "via_bonus_token",
+    "alternative_done",
+)
+DAILY_FIELDS = ("day", "smoked", "early", "avg_interval_minutes")
+
+
+def _spool() -> IO[str]:
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+", encoding="utf-8", newline="")
+
+
+def _event_row(event: SmokingEvent) -> Dict[str, Any]:
+    return {
+        "id": event.id,
+        "timestamp": event.timestamp.isoformat(),
+        "planned_time": event.planned_time.isoformat(),
+        "was_early": event.was_early,
+        "interval_before": event.interval_before,
+        "via_bonus_token": event.via_bonus_token,
+        "alternative_done": event.alternative_done,
+    }
+
+
+@dataclass(slots=True)
+class _Day:
+    day: dt.date
+    smoked: int = 0
+    early: int = 0
+    interval_total: int = 0
+
+    def row(self) -> Dict[str, Any]:
+        return {
+            "day": self.day.isoformat(),
+            "smoked": self.smoked,
+            "early": self.early,
+            "avg_interval_minutes": round(self.interval_total / self.smoked, 1),
+        }
+
+
+class _ExportWriter(abc.ABC):
+    """Incremental writer; ``write`` and ``finish`` run in a worker thread."""
+
+    extension = ""
+
+    def __init__(self, telegram_id: int) -> None:
+        self.telegram_id = telegram_id
+        self.events = 0
+        self._day: _Day | None = None
+        self._files: List[IO[str]] = []
+
+    def write(self, events: List[SmokingEvent]) -> None:
+        for event in events:
+            self._write_event(_event_row(event))
+            day = event.timestamp.date()
+            if self._day is None or self._day.day != day:
+                self._close_day()
+                self._day = _Day(day)
+            self._day.smoked += 1
+            self._day.early += event.was_early
+            self._day.interval_total += event.interval_before
+        self.events += len(events)
+
+    def finish(self) -> List["SpooledInputFile"]:
+        self._close_day()
+        return self._finish()
+
+    def close(self) -> None:
+        for f in self._files:
+            f.close()
+
+    def _close_day(self) -> None:
+        if self._day is not None:
+            self._write_day(self._day.row())
+            self._day = None
+
+    def _new_spool(self) -> IO[str]:
+        f = _spool()
+        self._files.append(f)
+        return f
+
+    @abc.abstractmethod
+    def _write_event(self, row: Dict[str, Any]) -> None: ...
+
+    @abc.abstractmethod
+    def _write_day(self, row: Dict[str, Any]) -> None: ...
+
+    @abc.abstractmethod
+    def _finish(self) -> List["SpooledInputFile"]: ...
+
+
+class CsvExportWriter(_ExportWriter):
+    """Two files: one row per event, one row per day."""
+
+    def __init__(self, telegram_id: int) -> None:
+        super().__init__(telegram_id)
+        self._events_file, self._daily_file = self._new_spool(), self._new_spool()
+        self._events_csv = csv.DictWriter(self._events_file, EVENT_FIELDS)
+        self._daily_csv = csv.DictWriter(self._daily_file, DAILY_FIELDS)
+        self._events_csv.writeheader()
+        self._daily_csv.writeheader()
+
+    def _write_event(self, row: Dict[str, Any]) -> None:
+        self._events_csv.writerow(row)
+
+    def _write_day(self, row: Dict[str, Any]) -> None:
+        self._daily_csv.writerow(row)
+
+    def _finish(self) -> List["SpooledInputFile"]:
+        return [
+            SpooledInputFile(self._events_file, f"smoking_history_{self.telegram_id}.csv"),
+            SpooledInputFile(self._daily_file, f"smoking_daily_{self.telegram_id}.csv"),
+        ]
+
+
+class JsonExportWriter(_ExportWriter):
+    """One document ``{"telegram_id", "exported_at", "events": [...], "daily": [...]}``.
+
+    Days are spooled separately and appended after the events array.
+    """
+
+    def __init__(self, telegram_id: int) -> None:
+        super().__init__(telegram_id)
+        self._file, self._daily_file = self._new_spool(), self._new_spool()
+        exported_at = dt.datetime.utcnow().isoformat(timespec="seconds")
+        self._file.write(f'{{"telegram_id": {telegram_id}, "exported_at": "{exported_at}", "events": [')
+        self._separator = self._daily_separator = "\n"
+
+    def _write_event(self, row: Dict[str, Any]) -> None:
+        self._file.write(self._separator + json.dumps(row, ensure_ascii=False))
+        self._separator = ",\n"
+
+    def _write_day(self, row: Dict[str, Any]) -> None:
+        self._daily_file.write(self._daily_separator + json.dumps(row, ensure_ascii=False))
+        self._daily_separator = ",\n"
+
+    def _finish(self) -> List["SpooledInputFile"]:
+        self._file.write('\n], "daily": [')
+        self._daily_file.seek(0)
+        shutil.copyfileobj(self._daily_file, self._file)
+        self._file.write("\n]}\n")
+        return [SpooledInputFile(self._file, f"smoking_history_{self.telegram_id}.json")]
+
+
+WRITERS = {"csv": CsvExportWriter, "json": JsonExportWriter}
+
+
+class SpooledInputFile(InputFile):
+    """Upload a spooled text file, reading it off the event loop."""
+
+    def __init__(self, file: IO[str], filename: str, chunk_size: int = 64 * 1024) -> None:
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot: "Bot") -> AsyncGenerator[bytes, None]:
+        await asyncio.to_thread(self.file.seek, 0)
+        while chunk := await asyncio.to_thread(self.file.read, self.chunk_size):
+            yield chunk.encode("utf-8")
+
+
+@dataclass
+class Export:
+    events: int = 0
+    files: List[SpooledInputFile] = field(default_factory=list)
+
+
+@asynccontextmanager
+async def export_history(
+    telegram_id: int, chunks: AsyncIterator[List[SmokingEvent]], fmt: str = "csv"
+) -> AsyncIterator[Export]:
+    """Serialize ``chunks`` (oldest first) into files that are deleted on exit."""
+    writer = WRITERS[fmt](telegram_id)
+    try:
+        async for events in chunks:
+            await asyncio.to_thread(writer.write, events)
+        yield Export(writer.events, await asyncio.to_thread(writer.finish))
+    finally:
+        writer.close()
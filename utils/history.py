@@ -0,0 +1,57 @@
+"""Utilities to render the paginated /history message."""
+
+from __future__ import annotations
+
+import datetime as dt
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from no_quitting_bot.core.usecases.history_page import Cursor, HistoryPage
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_MICROSECOND = dt.timedelta(microseconds=1)
+
+
+class HistoryCallback(CallbackData, prefix="HIST"):
+    """Next/prev button: the page is addressed by a cursor, not an offset."""
+
+    direction: str  # "older" | "newer"
+    timestamp: int  # event timestamp, microseconds since the epoch (naive UTC)
+    event_id: int
+
+    @classmethod
+    def for_cursor(cls, direction: str, cursor: Cursor) -> "HistoryCallback":
+        timestamp, event_id = cursor
+        return cls(direction=direction, timestamp=(timestamp - _EPOCH) // _MICROSECOND, event_id=event_id)
+
+    @property
+    def cursor(self) -> Cursor:
+        return _EPOCH + self.timestamp * _MICROSECOND, self.event_id
+
+
+def build_history_text(page: HistoryPage) -> str:
+    if not page.events:
+        return "📜 История пуста — ещё ни одной сигареты не записано."
+    lines = ["📜 <b>История</b> (UTC)"]
+    for event in page.events:
+        mark = "⚠️ раньше плана" if event.was_early else "✅ по плану"
+        lines.append(f"{event.timestamp:%d.%m %H:%M} — {mark}, интервал {event.interval_before} мин")
+    return "\n".join(lines)
+
+
+def build_history_keyboard(page: HistoryPage) -> InlineKeyboardMarkup | None:
+    row = []
+    if page.has_newer:
+        row.append(
+            InlineKeyboardButton(
+                text="◀️ Новее", callback_data=HistoryCallback.for_cursor("newer", page.newest).pack()
+            )
+        )
+    if page.has_older:
+        row.append(
+            InlineKeyboardButton(
+                text="Старее ▶️", callback_data=HistoryCallback.for_cursor("older", page.oldest).pack()
+            )
+        )
+    return InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import datetime as dt
+import hashlib
+from collections import OrderedDict
 from typing import Optional
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
@@ -50,7 +52,7 @@ def build_hub_text(
     return "\n".join(lines)
 
 
-def build_hub_keyboard(can_smoke: bool, allow_undo: bool) -> InlineKeyboardMarkup:
+def _make_hub_keyboard(allow_undo: bool) -> InlineKeyboardMarkup:
     """Собираем клавиатуру без функции задержки (+5 минут)."""
     smoke_btn = InlineKeyboardButton(text="🚬 Курю сейчас", callback_data="SMOKE_NOW")
 
@@ -63,4 +65,79 @@ def build_hub_keyboard(can_smoke: bool, allow_undo: bool) -> InlineKeyboardMarku
         InlineKeyboardButton(text="🔄 Обновить", callback_data="REFRESH"),
     ]
 
-    return InlineKeyboardMarkup(inline_keyboard=[row1, row2]) 
\ No newline at end of file
+    return InlineKeyboardMarkup(inline_keyboard=[row1, row2])
+
+
+# aiogram types are frozen models, so the few possible keyboards are built once and shared
+_HUB_KEYBOARDS = {allow_undo: _make_hub_keyboard(allow_undo) for allow_undo in (False, True)}
+
+ALTERNATIVE_KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Сделал", callback_data="ALT_DONE")],
+        [InlineKeyboardButton(text="🚬 Курю сейчас", callback_data="SMOKE_NOW")],
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data="REFRESH")],
+    ]
+)
+
+
+def build_hub_keyboard(can_smoke: bool, allow_undo: bool) -> InlineKeyboardMarkup:
+    """Return the prebuilt hub keyboard for the given state."""
+    return _HUB_KEYBOARDS[allow_undo]
+
+
+# ---------------------------------------------------------------------------
+# Render cache
+# ---------------------------------------------------------------------------
+
+
+class HubRenderCache:
+    """Remember what each user's hub message currently shows.
+
+    Entries map ``telegram_id -> (hub_message_id, version, digest)`` where the
+    digest covers the rendered text and keyboard and ``version`` is the user
+    row's version it was rendered from. If a new render produces the same
+    digest for the same message and row version, the Telegram edit can be
+    skipped. Bounded by ``max_size`` with least-recently-used eviction.
+
+    The cache is per process, so with several workers it relies on every
+    change to what the hub shows bumping the row version: a change made
+    elsewhere then makes the next render here miss and edit the message
+    again. Row writes bump it themselves. State kept outside the row, like
+    the pending alternative, must bump it explicitly when it changes
+    (``bump_version`` on the user repository).
+    """
+
+    def __init__(self, max_size: int = 10_000) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[int, int, bytes]] = OrderedDict()
+        # prebuilt keyboards are immutable, so their serialisation is computed once
+        self._keyboard_json: dict[int, str] = {
+            id(kb): kb.model_dump_json() for kb in (*_HUB_KEYBOARDS.values(), ALTERNATIVE_KEYBOARD)
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def digest(self, text: str, keyboard: InlineKeyboardMarkup) -> bytes:
+        kb_json = self._keyboard_json.get(id(keyboard)) or keyboard.model_dump_json()
+        return hashlib.blake2b(f"{text}\x00{kb_json}".encode(), digest_size=16).digest()
+
+    def is_current(self, telegram_id: int, message_id: int | None, version: int, digest: bytes) -> bool:
+        entry = self._entries.get(telegram_id)
+        if message_id is not None and entry == (message_id, version, digest):
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def remember(self, telegram_id: int, message_id: int, version: int, digest: bytes) -> None:
+        self._entries[telegram_id] = (message_id, version, digest)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def forget(self, telegram_id: int) -> None:
+        self._entries.pop(telegram_id, None)
@@ -0,0 +1,189 @@
+"""Minimal in-process metrics rendered in the Prometheus text format.
+
+Counters and histograms are plain dicts keyed by label values, so recording
+a sample is a dict lookup plus an add (histograms also bisect the bucket
+list). Gauges are callbacks evaluated only when ``/metrics`` is scraped.
+"""
+
+from __future__ import annotations
+
+import bisect
+from typing import Callable, Iterable, Mapping, Sequence
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [non-cumulative bucket counts..., +Inf count], sum
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> list[str]:
+        lines: list[str] = []
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class GaugeFunc(_Metric):
+    """Gauge read at scrape time: ``fn`` returns a value or ``{label_values: value}``."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        fn: Callable[[], float | Mapping[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def samples(self) -> list[str]:
+        result = self.fn()
+        if not isinstance(result, Mapping):
+            result = {(): result}
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in sorted(result.items())]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, tuple(labelnames)))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, tuple(labelnames), buckets))  # type: ignore[return-value]
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        fn: Callable[[], float | Mapping[LabelValues, float]],
+        labelnames: Iterable[str] = (),
+    ) -> GaugeFunc:
+        return self.register(GaugeFunc(name, documentation, fn, tuple(labelnames)))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines += metric.header()
+            lines += metric.samples()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------------------------------------------------------------------------
+# Process-wide series (recorded by middlewares, engine events and jobs)
+# ---------------------------------------------------------------------------
+HANDLER_SECONDS = REGISTRY.histogram(
+    "qs_handler_duration_seconds", "Handler run time", ("handler", "callback_data")
+)
+UPDATE_QUEUE_SECONDS = REGISTRY.histogram(
+    "qs_update_queue_seconds", "Time an accepted webhook update waited for a worker"
+)
+API_REQUESTS = REGISTRY.counter("qs_api_requests_total", "Bot API calls", ("method", "status"))
+API_SECONDS = REGISTRY.histogram("qs_api_request_duration_seconds", "Bot API call latency", ("method",))
+SQL_STATEMENTS = REGISTRY.counter("qs_sql_statements_total", "SQL statements executed", ("statement",))
+SQL_SECONDS = REGISTRY.histogram(
+    "qs_sql_statement_duration_seconds", "SQL statement execution time", ("statement",), SQL_BUCKETS
+)
+JOB_RUNS = REGISTRY.counter("qs_job_runs_total", "Scheduled job runs", ("job", "status"))
+JOB_SECONDS = REGISTRY.histogram("qs_job_duration_seconds", "Scheduled job run time", ("job",), JOB_BUCKETS)
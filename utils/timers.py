@@ -0,0 +1,109 @@
+"""Min-heap timer service: run a callback per key once its due time passes."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import heapq
+import logging
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+
+DEFAULT_CONCURRENCY = 20
+
+
+class TimerService(Generic[K]):
+    """At most one pending timer per key, fired by a single sleeping task.
+
+    ``schedule`` and ``cancel`` are O(log n) / O(1): superseded heap entries
+    are left in place and skipped when popped (the heap is compacted once
+    they outnumber live timers). The runner sleeps until the earliest due
+    time and is woken early only when a new earliest timer is scheduled, so
+    idle cost does not depend on the number of timers. Times are naive UTC
+    datetimes, like the rest of the bot.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[K], Awaitable[None]],
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> None:
+        self.callback = callback
+        self.fired = 0
+        self._heap: list[tuple[dt.datetime, K]] = []
+        self._due: dict[K, dt.datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._due
+
+    def schedule(self, key: K, when: dt.datetime) -> None:
+        """Fire ``callback(key)`` at ``when``, replacing any pending timer for ``key``."""
+        if self._due.get(key) == when:
+            return
+        self._due[key] = when
+        heapq.heappush(self._heap, (when, key))
+        if self._heap[0] == (when, key):
+            self._wakeup.set()
+        if len(self._heap) > 2 * len(self._due) + 1024:
+            self._compact()
+
+    def cancel(self, key: K) -> None:
+        self._due.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every pending timer."""
+        self._due.clear()
+        self._heap.clear()
+
+    def _compact(self) -> None:
+        self._heap = [(when, key) for key, when in self._due.items()]
+        heapq.heapify(self._heap)
+
+    async def run(self) -> None:
+        """Fire timers as they come due (runs until cancelled)."""
+        try:
+            while True:
+                self._wakeup.clear()
+                now = dt.datetime.utcnow()
+                while self._heap and self._heap[0][0] <= now:
+                    when, key = heapq.heappop(self._heap)
+                    if self._due.get(key) != when:
+                        continue  # cancelled or rescheduled
+                    del self._due[key]
+                    await self._fire(key)
+
+                timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+                # not wait_for: it spawns a task per sleep, and aiohttp's graceful
+                # shutdown waits (up to its timeout) for tasks created after startup
+                try:
+                    async with asyncio.timeout(timeout):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+        finally:
+            for task in self._running:
+                task.cancel()
+
+    async def _fire(self, key: K) -> None:
+        await self._slots.acquire()  # backpressure when many timers are due at once
+        task = asyncio.create_task(self._call(key))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _call(self, key: K) -> None:
+        try:
+            await self.callback(key)
+            self.fired += 1
+        except Exception as e:
+            logger.warning("Timer callback for %s failed: %s", key, e)
+        finally:
+            self._slots.release()
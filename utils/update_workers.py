@@ -0,0 +1,169 @@
+"""Per-user ordered background processing of webhook updates."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from no_quitting_bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARDS = 16
+DEFAULT_QUEUE_SIZE = 100  # per shard
+RETRY_AFTER_SECONDS = 1
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+
+@dataclass(slots=True)
+class UpdateQueueStats:
+    accepted: int = 0
+    rejected: int = 0  # queue full: answered 503, Telegram redelivers later
+    processed: int = 0
+    failed: int = 0
+    max_depth: int = 0
+    busy_seconds: float = 0.0
+    depths: list[int] = field(default_factory=list)
+
+    @property
+    def depth(self) -> int:
+        return sum(self.depths)
+
+    def __str__(self) -> str:
+        return (
+            f"accepted={self.accepted} rejected={self.rejected} processed={self.processed} "
+            f"failed={self.failed} depth={self.depth} max_depth={self.max_depth}"
+        )
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Best-effort sender id of a raw update (``None`` for e.g. polls)."""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        for owner in (event.get("from"), event.get("user"), event.get("chat")):
+            if isinstance(owner, dict) and "id" in owner:
+                return owner["id"]
+    return None
+
+
+class ShardedUpdateProcessor:
+    """Feed raw updates to the dispatcher from ``shards`` sequential workers.
+
+    An update goes to shard ``user_id % shards``, so one user's updates are
+    handled in arrival order while different users proceed in parallel.
+    Each shard queue holds at most ``queue_size`` updates; :meth:`submit`
+    returns ``False`` instead of blocking when it is full.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        shards: int = DEFAULT_SHARDS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        **data: Any,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.data = data
+        self.stats = UpdateQueueStats(depths=[0] * shards)
+        # (update, enqueue time) per shard
+        self._queues: list[asyncio.Queue[tuple[Dict[str, Any], float]]] = [
+            asyncio.Queue(maxsize=queue_size) for _ in range(shards)
+        ]
+        self._workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(len(self._queues))]
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        user_id = update_user_id(update)
+        shard = (user_id if user_id is not None else update.get("update_id", 0)) % len(self._queues)
+        queue = self._queues[shard]
+        try:
+            queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            logger.warning("Update queue shard %d is full, rejecting update %s", shard, update.get("update_id"))
+            return False
+        self.stats.accepted += 1
+        self.stats.depths[shard] = queue.qsize()
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+        return True
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> None:
+        """Process what is already queued (up to ``timeout``), then stop the workers."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d queued updates on shutdown", self.stats.depth)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Update workers stopped: %s", self.stats)
+
+    async def _worker(self, shard: int) -> None:
+        queue = self._queues[shard]
+        while True:
+            update, enqueued = await queue.get()
+            self.stats.depths[shard] = queue.qsize()
+            started = time.monotonic()
+            metrics.UPDATE_QUEUE_SECONDS.observe(started - enqueued)
+            try:
+                result = await self.dispatcher.feed_raw_update(bot=self.bot, update=update, **self.data)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+                self.stats.processed += 1
+            except Exception as e:
+                self.stats.failed += 1
+                logger.exception("Failed to process update %s: %s", update.get("update_id"), e)
+            finally:
+                self.stats.busy_seconds += time.monotonic() - started
+                queue.task_done()
+
+
+class ShardedRequestHandler(SimpleRequestHandler):
+    """Webhook handler that acknowledges at once and queues into a :class:`ShardedUpdateProcessor`.
+
+    A full shard is answered with ``503 Retry-After`` so Telegram redelivers
+    the update later instead of us buffering without bound.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        shards: int = DEFAULT_SHARDS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        secret_token: Optional[str] = None,
+        **data: Any,
+    ) -> None:
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.processor = ShardedUpdateProcessor(dispatcher, bot, shards=shards, queue_size=queue_size, **data)
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        app.on_startup.append(self._handle_start)
+        super().register(app, path=path, **kwargs)
+
+    async def _handle_start(self, app: web.Application) -> None:
+        self.processor.start()
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        if not self.processor.submit(update):
+            return web.Response(status=503, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        await self.processor.close()
+        await super().close()